@@ -0,0 +1,159 @@
+"""
+Resumable batch jobs that run without a browser session (cron / overnight syncs).
+
+    python batch.py upload catalog.csv [--chunk-size 1000] [--sync] [--restart]
+    python batch.py export [--platform Meesho Flipkart] [--format xlsx] [--changed] [--out-dir exports]
+    python batch.py payout --from 2024-01 --to 2024-06 [--out-dir payouts]
+    python batch.py reconcile [--dry-run]
+    python batch.py linkcheck [catalog.csv] [--refresh] [--out broken_links.csv]
+
+Progress is checkpointed to a JSON file after every chunk / platform / month, so a rerun of
+the same command continues where the last one stopped (--restart ignores the checkpoint).
+"""
+import argparse
+import datetime
+import json
+import logging
+import os
+import sys
+import time
+
+import pandas as pd
+
+import db_manager as db
+import linkcheck
+
+log = logging.getLogger("batch")
+
+
+# --- CHECKPOINTS ---
+class Checkpoint:
+    """JSON state file; `job` identifies the input so a changed file or range starts fresh."""
+    def __init__(self, path, job, restart=False):
+        self.path = path; self.job = job; self.state = {"job": job}
+        if not restart and os.path.exists(path):
+            with open(path) as f: saved = json.load(f)
+            if saved.get("job") == job: self.state = saved
+            else: log.warning("checkpoint %s belongs to a different job, starting over", path)
+
+    def get(self, key, default=None): return self.state.get(key, default)
+
+    def save(self, **values):
+        self.state.update(values); tmp = self.path + ".tmp"
+        with open(tmp, "w") as f: json.dump(self.state, f, indent=2, default=str)
+        os.replace(tmp, self.path)
+
+    def clear(self):
+        if os.path.exists(self.path): os.remove(self.path)
+
+def rate(rows, seconds): return f"{rows / seconds:,.0f} rows/s" if seconds > 0 else "-"
+
+
+# --- JOBS ---
+def read_catalog_chunks(path, chunk_size):
+    """Raw all-string chunks: CSV is streamed, Excel is read once and sliced."""
+    if path.lower().endswith((".xlsx", ".xls")): return db.iter_frame_chunks(pd.read_excel(path, dtype=str), chunk_size)
+    return db.read_catalog_csv(path, chunk_size)
+
+def run_upload(path, chunk_size=db.UPLOAD_CHUNK_SIZE, errors_path=None, restart=False, sync=False):
+    """bulk_upload_catalog one chunk at a time; errors are appended to <file>.errors.csv as they happen."""
+    st = os.stat(path); errors_path = errors_path or os.path.splitext(path)[0] + ".errors.csv"
+    cp = Checkpoint(path + ".checkpoint.json", {"file": os.path.abspath(path), "size": st.st_size, "mtime": st.st_mtime, "sync": sync}, restart)
+    if cp.get("rows_done") is None and os.path.exists(errors_path): os.remove(errors_path)  # fresh run, fresh report
+    done, ok, failed = cp.get("rows_done", 0), cp.get("success", 0), cp.get("errors", 0)
+    if done: log.info("resuming %s after row %s", path, done)
+    t0 = time.perf_counter(); start_done = done
+    for chunk in read_catalog_chunks(path, chunk_size):
+        if chunk.index[-1] < done: continue  # finished in an earlier run
+        chunk = chunk[chunk.index >= done]
+        success, errs = db.bulk_upload_catalog(chunk, chunk_size=chunk_size, sync=sync)
+        if not errs.empty: errs.to_csv(errors_path, mode="a", header=not os.path.exists(errors_path), index=False)
+        done = int(chunk.index[-1]) + 1; ok += success; failed += len(errs)
+        cp.save(rows_done=done, success=ok, errors=failed)
+        log.info("upload %s rows, %s ok, %s errors (%s)", done, ok, failed, rate(done - start_done, time.perf_counter() - t0))
+    cp.clear()
+    log.info("upload finished: %s ok, %s errors%s", ok, failed, f" -> {errors_path}" if failed else "")
+    return ok, failed
+
+def run_export(platforms=None, fmt="csv", out_dir="exports", restart=False, changed_only=False):
+    """One file per platform, written to a .part file and renamed when complete.
+    changed_only: rows edited since that platform's last export (<platform>_Changes.<fmt>)."""
+    platforms = platforms or list(db.MARKETPLACE_TEMPLATES)
+    os.makedirs(out_dir, exist_ok=True)
+    cp = Checkpoint(os.path.join(out_dir, "export.checkpoint.json"), {"platforms": platforms, "format": fmt, "changed": changed_only}, restart)
+    finished = cp.get("finished", [])
+    for plat in platforms:
+        if plat in finished: log.info("export %s already done, skipping", plat); continue
+        target = os.path.join(out_dir, f"{plat}_{'Changes' if changed_only else 'List'}.{fmt}"); t0 = time.perf_counter(); started = datetime.datetime.now()
+        with open(target + ".part", "wb") as out: rows = db.write_marketplace_file(plat, out, fmt, since=db.export_since(plat, changed_only))
+        os.replace(target + ".part", target); db.set_export_watermark(plat, started)
+        finished.append(plat); cp.save(finished=finished)
+        log.info("export %s: %s rows -> %s (%s)", plat, rows, target, rate(rows, time.perf_counter() - t0))
+    cp.clear()
+
+def month_range(start, end):
+    (y, m), (ey, em) = start, end
+    while (y, m) <= (ey, em):
+        yield y, m
+        y, m = (y + 1, 1) if m == 12 else (y, m + 1)
+
+def run_payout(start, end, out_dir="payouts", refresh=False, restart=False):
+    """get_staff_payout per month into <out_dir>/payout_YYYY-MM.csv."""
+    os.makedirs(out_dir, exist_ok=True)
+    cp = Checkpoint(os.path.join(out_dir, "payout.checkpoint.json"), {"from": start, "to": end}, restart)
+    finished = cp.get("finished", [])
+    for y, m in month_range(start, end):
+        key = f"{y}-{m:02d}"
+        if key in finished: continue
+        t0 = time.perf_counter(); df = db.get_staff_payout(m, y, refresh=refresh)
+        df.to_csv(os.path.join(out_dir, f"payout_{key}.csv"), index=False)
+        finished.append(key); cp.save(finished=finished)
+        total = df['Total Pay'].sum() if not df.empty else 0
+        log.info("payout %s: %s rows, total %.2f (%s)", key, len(df), total, rate(len(df), time.perf_counter() - t0))
+    cp.clear()
+
+
+# --- CLI ---
+def year_month(s):
+    try: y, m = s.split("-"); return int(y), int(m)
+    except ValueError: raise argparse.ArgumentTypeError("expected YYYY-MM")
+
+def main(argv=None):
+    p = argparse.ArgumentParser(description="Shine Arc batch jobs")
+    p.add_argument("--restart", action="store_true", help="ignore any checkpoint and start from the beginning")
+    sub = p.add_subparsers(dest="cmd", required=True)
+    up = sub.add_parser("upload", help="bulk catalog upload from CSV/XLSX")
+    up.add_argument("file"); up.add_argument("--chunk-size", type=int, default=db.UPLOAD_CHUNK_SIZE); up.add_argument("--errors")
+    up.add_argument("--sync", action="store_true", help="full catalog file: rewrite only SKUs whose content changed")
+    ex = sub.add_parser("export", help="marketplace listing files")
+    ex.add_argument("--platform", nargs="*", choices=list(db.MARKETPLACE_TEMPLATES)); ex.add_argument("--format", choices=["csv", "xlsx"], default="csv"); ex.add_argument("--out-dir", default="exports")
+    ex.add_argument("--changed", action="store_true", help="only rows edited since each platform's last export")
+    pay = sub.add_parser("payout", help="monthly staff payout sheets")
+    pay.add_argument("--from", dest="start", type=year_month, required=True); pay.add_argument("--to", dest="end", type=year_month, required=True)
+    pay.add_argument("--out-dir", default="payouts"); pay.add_argument("--refresh", action="store_true", help="recompute closed months instead of using snapshots")
+    lc = sub.add_parser("linkcheck", help="report broken image links of the catalog or of an upload file")
+    lc.add_argument("file", nargs="?", help="upload CSV/XLSX to check instead of the live catalog")
+    lc.add_argument("--refresh", action="store_true", help="ignore cached results"); lc.add_argument("--out", default="broken_links.csv")
+    rec = sub.add_parser("reconcile", help="recompute dashboard counters and report drift")
+    rec.add_argument("--dry-run", action="store_true", help="report drift without correcting it")
+    args = p.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    try:
+        if args.cmd == "upload": ok, failed = run_upload(args.file, args.chunk_size, args.errors, args.restart, args.sync); return 1 if failed else 0
+        if args.cmd == "export": run_export(args.platform, args.format, args.out_dir, args.restart, args.changed)
+        if args.cmd == "payout": run_payout(args.start, args.end, args.out_dir, args.refresh, args.restart)
+        if args.cmd == "linkcheck":
+            rep = linkcheck.verify_upload_links(read_catalog_chunks(args.file, db.UPLOAD_CHUNK_SIZE), args.refresh) if args.file else linkcheck.verify_catalog_links(args.refresh)
+            rep.to_csv(args.out, index=False)
+            log.info("linkcheck: %s broken link(s)%s", len(rep), f" -> {args.out}" if len(rep) else ""); return 1 if len(rep) else 0
+        if args.cmd == "reconcile":
+            drift = db.reconcile_live_stats(fix=not args.dry_run)
+            for k, (stored, exact) in drift.items(): log.warning("drift %s: stored %s, actual %s", k, stored, exact)
+            log.info("reconcile: %s", f"{len(drift)} counter(s) drifted" if drift else "no drift"); return 1 if drift else 0
+    except db.ConfigError as e:
+        log.error("%s", e); return 2
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,182 @@
+"""
+Benchmarks for the db_manager hot paths against a local mongod.
+
+    python bench.py --scale 10k                      # seed + run, print table
+    python bench.py --scale 10k --save-baseline      # store results in bench_baseline.json
+    python bench.py --scale 10k --compare            # exit 1 if anything regressed
+
+Records wall time (median of --repeat runs), MongoDB round trips and peak Python memory per function.
+The bench database is dropped and re-seeded on every run unless --reuse is given.
+"""
+import argparse
+import datetime
+import json
+import os
+import random
+import statistics
+import sys
+import time
+import tracemalloc
+
+import pandas as pd
+from pymongo import monitoring
+
+SCALES = {"1k": 1_000, "10k": 10_000, "100k": 100_000, "1m": 1_000_000}
+BASELINE_FILE = "bench_baseline.json"
+SEED_BATCH = 10_000
+STAGES = ["Cutting", "Stitching - Ravi", "Stitching - Amit", "Finishing - Ravi", "Packing"]
+SIZES = ["S", "M", "L", "XL"]
+
+
+# --- ROUND-TRIP COUNTER ---
+class RoundTrips(monitoring.CommandListener):
+    """Counts commands sent to the server; registered before db_manager creates its client."""
+    def __init__(self): self.count = 0
+    def started(self, event): self.count += 1
+    def succeeded(self, event): pass
+    def failed(self, event): pass
+
+TRIPS = RoundTrips()
+monitoring.register(TRIPS)
+
+
+def connect(uri, name):
+    if name == "shine_arc_mes_db": sys.exit("Refusing to benchmark against the production database name.")
+    import db_manager
+    db_manager.configure(MONGO_URI=uri, MONGO_DB=name)
+    return db_manager
+
+
+# --- SYNTHETIC DATA ---
+def insert_batched(coll, docs):
+    batch = []
+    for d in docs:
+        batch.append(d)
+        if len(batch) >= SEED_BATCH: coll.insert_many(batch, ordered=False); batch = []
+    if batch: coll.insert_many(batch, ordered=False)
+
+def seed(dm, n, rng):
+    """n catalog rows (seeded flat, then migrated to groups), transactions, ledger entries and attendance rows; n/10 lots."""
+    db = dm.db
+    for c in db.list_collection_names(): db.drop_collection(c)
+    dm.ensure_indexes(db)
+    now = datetime.datetime.now(); month_start = now.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+    items = [f"Item {i}" for i in range(50)]; staff = [f"Staff {i}" for i in range(max(10, n // 1000))]
+    suppliers = [f"Supplier {i}" for i in range(max(5, n // 5000))]
+    db.staff.insert_many([{"name": s, "role": "Karigar"} for s in staff])
+    db.suppliers.insert_many([{"name": s} for s in suppliers])
+    db.rates.insert_many([{"item": it, "process": p, "rate": round(rng.uniform(2, 20), 2)} for it in items for p in ("Stitching", "Finishing", "Packing")])
+
+    insert_batched(db.catalog, ({"sku": f"SKU{i:07d}-{SIZES[i % 4]}", "group_id": f"DRC{101 + i // 4}", "sort_index": 101 + i // 4,
+                                 "product_name": f"{rng.choice(items)} {i // 4}", "variation": SIZES[i % 4], "color": rng.choice(["Red", "Blue", "Black", "White"]),
+                                 "image_link_1": f"https://img.example.com/{i}.jpg", "mrp": 999.0, "selling_price": float(rng.randint(299, 899)), "stock": rng.randint(0, 50),
+                                 "description": "Synthetic product", "last_updated": now} for i in range(n)))
+    dm.migrate_catalog_to_groups()
+    db.drc_allocator.delete_many({}); dm.init_drc_allocator(force=True)
+
+    n_lots = max(1, n // 10)
+    def lot(i):
+        cut = {s: rng.randint(0, 20) for s in SIZES}; st_ = {s: rng.randint(0, 20) for s in SIZES}
+        stock = {"Cutting": cut, rng.choice(STAGES[1:3]): st_}
+        return {"lot_no": f"LOT{i + 1:06d}", "item_name": rng.choice(items), "item_code": "C1", "color": "Red", "total_qty": sum(cut.values()) + sum(st_.values()),
+                "size_breakdown": cut, "current_stage_stock": stock, "status": "Active" if i % 3 else "Completed", "date_created": now - datetime.timedelta(days=i % 90)}
+    insert_batched(db.lots, (lot(i) for i in range(n_lots)))
+    dm.rebuild_stage_totals()
+
+    insert_batched(db.transactions, ({"lot_no": f"LOT{rng.randint(1, n_lots):06d}", "from_stage": "Cutting", "to_stage": rng.choice(STAGES[1:]), "karigar": rng.choice(staff),
+                                     "qty": rng.randint(1, 10), "size": rng.choice(SIZES), "timestamp": month_start - datetime.timedelta(minutes=rng.randint(1, 60 * 24 * 60))} for _ in range(n)))
+    insert_batched(db.supplier_ledger, ({"supplier": rng.choice(suppliers), "date": now - datetime.timedelta(days=rng.randint(0, 365)), "type": rng.choice(["Bill", "Payment"]),
+                                        "amount": float(rng.randint(100, 50000)), "reference": f"R{i}", "remarks": "", "created_at": now} for i in range(n)))
+    days = max(1, n // len(staff))
+    insert_batched(db.attendance, ({"staff": s, "date": (now - datetime.timedelta(days=d)).replace(hour=0, minute=0, second=0, microsecond=0), "in_time": "09:30", "status": "Present"}
+                                   for d in range(days) for s in staff))
+    dm.rebuild_supplier_summary()
+    return {"supplier": suppliers[0], "prev_month": (month_start - datetime.timedelta(days=1)).month, "prev_year": (month_start - datetime.timedelta(days=1)).year}
+
+def upload_frame(n, rng):
+    """n new rows for bulk_upload_catalog, a tenth of them with generated SKUs."""
+    return pd.DataFrame([{"Action": "", "SKU Code": "" if i % 10 == 0 else f"NEW{i:07d}", "Variation": "S, M" if i % 10 == 0 else rng.choice(SIZES),
+                          "Product Name": f"New {i}", "Image Link 1": f"https://img.example.com/new{i}.jpg", "Color": "Red", "MRP": "999", "Selling Price": "499", "Stock": "5"} for i in range(n)])
+
+
+# --- RUNNER ---
+def measure(fn, repeat, setup=None):
+    """`setup` runs before every repeat, outside the timing."""
+    times, trips, peak = [], 0, 0
+    for _ in range(repeat):
+        if setup: setup()
+        tracemalloc.start(); TRIPS.count = 0; t0 = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - t0); trips = TRIPS.count
+        peak = max(peak, tracemalloc.get_traced_memory()[1]); tracemalloc.stop()
+    return {"seconds": round(statistics.median(times), 4), "round_trips": trips, "peak_mb": round(peak / 2**20, 2)}
+
+def cases(dm, n, ctx, rng):
+    upload_rows = max(100, n // 10)
+    def reset_upload():
+        """Drops the groups the previous upload created and recycles their DRC numbers, so every run starts alike."""
+        new = {"product_name": {"$regex": "^New "}}
+        nums = dm.db.catalog_groups.distinct("sort_index", new)
+        dm.db.catalog_groups.delete_many(new); dm.release_unused_drc_numbers(nums)
+    return [
+        ("bulk_upload_catalog", lambda: dm.bulk_upload_catalog(upload_frame(upload_rows, rng)), reset_upload),
+        ("generate_marketplace_file", lambda: dm.generate_marketplace_file("Meesho")),
+        ("get_staff_payout", lambda: dm.get_staff_payout(ctx["prev_month"], ctx["prev_year"], refresh=True)),
+        ("get_supplier_ledger", lambda: dm.get_supplier_ledger(ctx["supplier"])),
+        ("get_dashboard_stats", dm.get_dashboard_stats),
+        ("track_lot_summary", lambda: (dm.get_production_totals(), dm.get_lot_summary())),
+    ]
+
+def compare(results, baseline, tolerance):
+    """Regression = slower than baseline by more than `tolerance`, or more round trips / memory."""
+    rows = []
+    for name, r in results.items():
+        b = baseline.get(name)
+        if not b: rows.append((name, "new", "")); continue
+        flags = []
+        if r["seconds"] > b["seconds"] * (1 + tolerance): flags.append(f"time {b['seconds']}s -> {r['seconds']}s")
+        if r["round_trips"] > b["round_trips"]: flags.append(f"round trips {b['round_trips']} -> {r['round_trips']}")
+        if r["peak_mb"] > b["peak_mb"] * (1 + tolerance): flags.append(f"memory {b['peak_mb']}MB -> {r['peak_mb']}MB")
+        rows.append((name, "REGRESSION" if flags else "ok", "; ".join(flags)))
+    return rows
+
+def main(argv=None):
+    p = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    p.add_argument("--scale", choices=SCALES, default="1k")
+    p.add_argument("--uri", default=os.environ.get("BENCH_MONGO_URI", "mongodb://localhost:27017"))
+    p.add_argument("--db", default="shine_arc_bench")
+    p.add_argument("--repeat", type=int, default=3)
+    p.add_argument("--only", nargs="*", help="function names to run")
+    p.add_argument("--reuse", action="store_true", help="skip seeding; use the data already in --db")
+    p.add_argument("--baseline", default=BASELINE_FILE)
+    p.add_argument("--save-baseline", action="store_true")
+    p.add_argument("--compare", action="store_true")
+    p.add_argument("--tolerance", type=float, default=0.25)
+    args = p.parse_args(argv)
+
+    dm = connect(args.uri, args.db); n = SCALES[args.scale]; rng = random.Random(42)
+    if args.reuse:
+        month_start = datetime.datetime.now().replace(day=1); prev = month_start - datetime.timedelta(days=1)
+        ctx = {"supplier": dm.db.supplier_ledger.find_one({}, {"supplier": 1})["supplier"], "prev_month": prev.month, "prev_year": prev.year}
+    else:
+        t0 = time.perf_counter(); ctx = seed(dm, n, rng); print(f"seeded {args.scale} in {time.perf_counter() - t0:.1f}s")
+
+    results = {}
+    for name, fn, *setup in cases(dm, n, ctx, rng):
+        if args.only and name not in args.only: continue
+        results[name] = measure(fn, args.repeat, *setup)
+    print(pd.DataFrame(results).T.to_string())
+
+    stored = json.load(open(args.baseline)) if os.path.exists(args.baseline) else {}
+    if args.save_baseline:
+        stored[args.scale] = {**stored.get(args.scale, {}), **results}
+        with open(args.baseline, "w") as f: json.dump(stored, f, indent=2, sort_keys=True)
+        print(f"baseline for {args.scale} saved to {args.baseline}")
+    if args.compare:
+        rows = compare(results, stored.get(args.scale, {}), args.tolerance)
+        print(pd.DataFrame(rows, columns=["Function", "Status", "Detail"]).to_string(index=False))
+        return 1 if any(r[1] == "REGRESSION" for r in rows) else 0
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
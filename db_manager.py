@@ -1,24 +1,197 @@
-import streamlit as st
+import time
+_T0 = time.perf_counter()
 import pymongo
 import pandas as pd
 import datetime
 import re
+import logging
+import os
 from bson.objectid import ObjectId
+from pymongo import InsertOne, ReplaceOne, UpdateOne
+from pymongo.errors import BulkWriteError
 import io
+import hashlib
+import itertools
+import copy
+import functools
+import tempfile
+from collections import deque
+import sys
+import json
+import threading
+from pymongo import monitoring
+
+log = logging.getLogger(__name__)
+
+# --- CONFIGURATION ---
+# Resolved on first use, in order: configure() > environment > config file > Streamlit secrets.
+# Nothing connects at import time, so cron jobs, scripts and tests can import this module freely.
+CONFIG_FILE = os.environ.get("SHINEARC_CONFIG", "shinearc.toml")
+DEFAULT_CONFIG = {"MONGO_DB": "shine_arc_mes_db", "MONGO_MAX_POOL": 20, "MONGO_MIN_POOL": 0,
+                  "MONGO_TIMEOUT_MS": 5000, "MONGO_SOCKET_TIMEOUT_MS": 60000}
+CONFIG_KEYS = ["MONGO_URI", *DEFAULT_CONFIG]
+
+class ConfigError(Exception):
+    """No usable MongoDB configuration was found."""
+
+_overrides = {}
+
+def load_config():
+    """Merged settings dict; raises ConfigError without a MONGO_URI."""
+    cfg = dict(DEFAULT_CONFIG); sources = []
+    try:  # Streamlit secrets only when running under Streamlit with a secrets.toml
+        import streamlit as st
+        sources.append({k: st.secrets[k] for k in CONFIG_KEYS if k in st.secrets})
+    except Exception: pass
+    if os.path.exists(CONFIG_FILE):
+        import tomllib
+        with open(CONFIG_FILE, "rb") as f: sources.append(tomllib.load(f))
+    sources.append({k: os.environ[k] for k in CONFIG_KEYS if os.environ.get(k)})
+    sources.append(_overrides)
+    for s in sources: cfg.update({k: v for k, v in s.items() if k in CONFIG_KEYS})
+    if not cfg.get("MONGO_URI"): raise ConfigError(f"MONGO_URI is not set (environment, {CONFIG_FILE} or .streamlit/secrets.toml)")
+    return cfg
+
+def configure(**settings):
+    """Explicit settings (e.g. MONGO_URI=..., MONGO_DB=...) for scripts; drops any open client."""
+    global _db
+    unknown = set(settings) - set(CONFIG_KEYS)
+    if unknown: raise ConfigError(f"Unknown settings: {', '.join(sorted(unknown))}")
+    _overrides.update(settings)
+    with _db_lock:
+        if _db is not None: _db.client.close()
+        _db = None
+
+# --- QUERY PROFILER ---
+# Every command is timed by a CommandListener on the client. Records are kept only while a
+# rerun bucket is open on the current thread (begin_rerun/end_rerun), so the cost when off is one lookup.
+# Closed buckets belong to the caller: the app keeps them per Streamlit session (ui.profile_history).
+
+class QueryProfiler(monitoring.CommandListener):
+    def __init__(self): self.local = threading.local(); self.pending = {}
+
+    def caller(self):
+        """Innermost db_manager function below the pymongo call."""
+        f = sys._getframe(2)
+        while f is not None:
+            if f.f_code.co_filename == __file__ and f.f_code.co_name not in ("started", "caller"): return f.f_code.co_name
+            f = f.f_back
+        return "?"
+
+    def started(self, event):
+        bucket = getattr(self.local, "bucket", None)
+        if bucket is None: return
+        target = event.command.get(event.command_name)
+        coll = target if isinstance(target, str) else event.command.get("collection", "")
+        self.pending[(event.request_id, event.operation_id)] = (bucket, {"command": event.command_name, "collection": coll, "caller": self.caller(), "ms": None, "docs": None, "ok": None})
+
+    def finish(self, event, ok, reply=None):
+        hit = self.pending.pop((event.request_id, event.operation_id), None)
+        if hit is None: return
+        bucket, rec = hit; rec["ms"] = round(event.duration_micros / 1000, 2); rec["ok"] = ok
+        if reply:
+            cur = reply.get("cursor") or {}
+            batch = cur.get("firstBatch", cur.get("nextBatch"))
+            rec["docs"] = len(batch) if batch is not None else reply.get("n")
+        bucket["queries"].append(rec)
+
+    def succeeded(self, event): self.finish(event, True, event.reply)
+    def failed(self, event): self.finish(event, False)
+
+PROFILER = QueryProfiler()
+
+def begin_rerun(label=""):
+    """Starts collecting the commands issued by this thread (one Streamlit rerun)."""
+    PROFILER.local.bucket = {"label": label, "started": datetime.datetime.now().isoformat(timespec="seconds"), "queries": []}
+
+def end_rerun():
+    """Closes the current bucket and returns it (None if none was open)."""
+    bucket = getattr(PROFILER.local, "bucket", None); PROFILER.local.bucket = None
+    if bucket is not None: bucket["total_ms"] = round(sum(q["ms"] or 0 for q in bucket["queries"]), 2)
+    return bucket
+
+def profile_tables(bucket, top=10):
+    """(slowest, most repeated) DataFrames for one rerun bucket."""
+    df = pd.DataFrame(bucket["queries"], columns=["command", "collection", "caller", "ms", "docs", "ok"])
+    if df.empty: return df, df
+    slowest = df.sort_values("ms", ascending=False).head(top)
+    repeated = df.groupby(["command", "collection", "caller"], as_index=False).agg(count=("ms", "size"), total_ms=("ms", "sum"), docs=("docs", "sum")).sort_values(["count", "total_ms"], ascending=False).head(top)
+    return slowest, repeated
+
+def export_profile(buckets): return json.dumps(list(buckets), indent=2, default=str)
 
 # --- DATABASE CONNECTION ---
-try:
-    MONGO_URI = st.secrets["MONGO_URI"]
-except:
-    st.error("MongoDB Secrets Missing!")
-    st.stop()
+_db = None
+_db_lock = threading.Lock()
 
-@st.cache_resource
 def get_db():
-    client = pymongo.MongoClient(MONGO_URI)
-    return client['shine_arc_mes_db']
+    """The shared Database, created on first use (one client and pool per process)."""
+    global _db
+    if _db is None:
+        with _db_lock:
+            if _db is None:
+                cfg = load_config()
+                client = pymongo.MongoClient(cfg["MONGO_URI"], maxPoolSize=int(cfg["MONGO_MAX_POOL"]), minPoolSize=int(cfg["MONGO_MIN_POOL"]),
+                                             serverSelectionTimeoutMS=int(cfg["MONGO_TIMEOUT_MS"]), connectTimeoutMS=int(cfg["MONGO_TIMEOUT_MS"]),
+                                             socketTimeoutMS=int(cfg["MONGO_SOCKET_TIMEOUT_MS"]), appname="shinearc", event_listeners=[PROFILER])
+                database = client[cfg["MONGO_DB"]]
+                ensure_indexes(database)
+                _db = database
+    return _db
 
-db = get_db()
+class LazyDatabase:
+    """Module-level `db`: forwards to get_db(), so the connection opens on the first query."""
+    def __getattr__(self, name): return getattr(get_db(), name)
+    def __getitem__(self, name): return get_db()[name]
+
+# --- INDEX REGISTRY ---
+# collection -> [(keys, options)]. Applied idempotently at startup by ensure_indexes().
+# Unique constraints mirror what the code already assumes (one doc per SKU, lot, upsert key).
+JOB_RETENTION_DAYS = int(os.environ.get("JOB_RETENTION_DAYS", 7))  # finished jobs expire after this; jobs.sweep_artifacts drops their files
+INDEXES = {
+    # variants.sku is unique only where present, so groups emptied mid-upload don't collide
+    "catalog_groups": [([("variants.sku", 1)], {"unique": True, "partialFilterExpression": {"variants.sku": {"$exists": True}}}),
+                       # catalog page order (sort_index, _id), also under the two halves of the color filter
+                       ([("sort_index", 1), ("_id", 1)], {}), ([("color", 1), ("sort_index", 1), ("_id", 1)], {}), ([("variants.attrs.color", 1), ("sort_index", 1), ("_id", 1)], {}),
+                       ([("variants.selling_price", 1)], {}), ([("variants.last_updated", 1)], {}), ([("product_name", "text"), ("variants.sku", "text"), ("description", "text")], {"name": "catalog_text"})],
+    "catalog": [([("sku", 1)], {"unique": True}), ([("group_id", 1), ("sort_index", -1), ("sku", 1)], {})],  # pre-grouping layout, read by migrate_catalog_to_groups
+    "fabric_inventory": [([("fabric_name", 1), ("color", 1)], {"unique": True})],
+    "fabric_rolls": [([("status", 1)], {}), ([("fabric_name", 1), ("color", 1), ("status", 1)], {}), ([("batch_id", 1)], {})],
+    "transactions": [([("lot_no", 1), ("timestamp", -1)], {}), ([("timestamp", 1)], {}), ([("karigar", 1), ("timestamp", 1)], {})],
+    "supplier_ledger": [([("supplier", 1), ("date", 1), ("_id", 1)], {}), ([("type", 1), ("created_at", 1)], {}), ([("reference", 1)], {})],
+    "attendance": [([("staff", 1), ("date", 1)], {"unique": True}), ([("date", 1)], {})],
+    "lots": [([("lot_no", 1)], {"unique": True}), ([("status", 1), ("date_created", 1)], {}), ([("date_created", -1)], {})],
+    "rates": [([("item", 1), ("process", 1)], {"unique": True})],
+    "items": [([("item_name", 1)], {}), ([("item_code", 1)], {})],
+    "staff": [([("role", 1)], {}), ([("name", 1)], {})],
+    "accessories": [([("name", 1)], {"unique": True})],
+    "throughput_daily": [([("date", 1), ("stage", 1), ("karigar", 1), ("item", 1)], {"unique": True}), ([("family", 1), ("date", 1)], {})],
+    "jobs": [([("active_key", 1)], {"unique": True, "partialFilterExpression": {"active_key": {"$exists": True}}}), ([("created_at", -1)], {}), ([("state", 1), ("owner", 1)], {}),
+             ([("finished_at", 1)], {"expireAfterSeconds": JOB_RETENTION_DAYS * 86400})],  # TTL; active jobs have no finished_at
+    "job_artifacts.files": [([("job_id", 1)], {})],
+    "image_link_cache": [([("expires_at", 1)], {"expireAfterSeconds": 0})],  # per-document TTL (linkcheck.py)
+    "gst_slabs": [([("rate", 1)], {"unique": True})],
+    "suppliers": [([("name", 1)], {})],
+    "materials": [([("name", 1)], {})],
+    "colors": [([("name", 1)], {})],
+    "processes": [([("name", 1)], {})],
+    "sizes": [([("name", 1)], {})],
+}
+
+def ensure_indexes(database):
+    """Creates every registry index that is missing. Returns a list of problems (never raises)."""
+    problems = []
+    for coll, specs in INDEXES.items():
+        for keys, opts in specs:
+            try: database[coll].create_index(keys, **opts)
+            except pymongo.errors.ConnectionFailure as e:  # server unreachable: don't wait out the timeout per index
+                log.warning("indexes not checked: %s", e); return problems + [f"connection: {e}"]
+            except pymongo.errors.PyMongoError as e:
+                problems.append(f"{coll} {keys}: {e}")
+                log.warning("index %s %s not created: %s", coll, keys, e)
+    return problems
+
+db = LazyDatabase()
 
 # ==========================================
 # 1. CATALOG & SMART UPLOAD
@@ -26,6 +199,7 @@ db = get_db()
 
 # --- SAFE CONVERSION HELPERS ---
 def safe_float(val):
+    if isinstance(val, float): return 0.0 if val != val else val  # already cleaned by clean_catalog_frame
     try:
         if pd.isna(val) or str(val).strip() == "": return 0.0
         clean_val = str(val).replace("%", "").replace(",", "").replace("₹", "").strip()
@@ -33,393 +207,1366 @@ def safe_float(val):
     except: return 0.0
 
 def safe_int(val):
+    if isinstance(val, float): return 0 if val != val else int(val)
     try:
         if pd.isna(val) or str(val).strip() == "": return 0
         clean_val = str(val).replace(",", "").split(".")[0].strip()
         return int(clean_val)
     except: return 0
 
-def get_next_free_drc_number(reserved_indices=set()):
+# --- DRC GROUP NUMBER ALLOCATOR ---
+# One document in `drc_allocator` holds the next fresh number and a sorted list of
+# recycled gaps, so handing out numbers never scans the catalog.
+DRC_START = 101
+
+def init_drc_allocator(force=False):
+    """
+    Seeds the allocator from the catalog: every gap below the highest used sort_index is free.
+    Ex: If 101, 103 exist -> free = [102], next = 104.
     """
-    Finds the first available gap in the sequence to recycle numbers.
-    Ex: If 101, 103 exist, it returns 102.
+    used = {int(i) for i in catalog_groups().distinct("sort_index") if i and int(i) >= DRC_START}
+    top = max(used, default=DRC_START - 1)
+    doc = {"next": top + 1, "free": [n for n in range(DRC_START, top + 1) if n not in used], "last_block": []}
+    if force: db.drc_allocator.replace_one({"_id": "drc"}, doc, upsert=True)
+    else: db.drc_allocator.update_one({"_id": "drc"}, {"$setOnInsert": doc}, upsert=True)
+
+def reserve_drc_numbers(count):
     """
-    # Get all currently used sort_indices from DB
-    used_indices = set(db.catalog.distinct("sort_index"))
-    
-    # Combine with indices reserved during this specific upload session
-    all_unavailable = used_indices.union(reserved_indices)
-    
-    num = 101
-    while True:
-        if num not in all_unavailable:
-            return num
-        num += 1
-
-def bulk_upload_catalog(df):
+    Atomically reserves `count` numbers in one round trip.
+    Lowest recycled gaps are handed out first, then fresh numbers from the top.
     """
-    Smart Uploader with Duplicate Check, Updates, Deletions, and ID Recycling.
-    Returns: (success_count, error_df)
+    if count <= 0: return []
+    size = {"$size": "$free"}
+    take = {"$min": [count, size]}
+    fresh = {"$subtract": [count, take]}
+    pipeline = [{"$set": {
+        "last_block": {"$concatArrays": [{"$slice": ["$free", {"$max": [take, 1]}]}, {"$range": ["$next", {"$add": ["$next", fresh]}]}]},
+        "free": {"$slice": ["$free", take, {"$max": [size, 1]}]},
+        "next": {"$add": ["$next", fresh]}
+    }}]
+    doc = db.drc_allocator.find_one_and_update({"_id": "drc"}, pipeline, projection={"last_block": 1}, return_document=pymongo.ReturnDocument.AFTER)
+    if doc is None:
+        init_drc_allocator()
+        return reserve_drc_numbers(count)
+    return doc['last_block']
+
+def release_drc_numbers(numbers):
+    """Puts numbers back into the free list (kept sorted, no duplicates)."""
+    nums = sorted({int(n) for n in numbers if n and int(n) >= DRC_START})
+    if not nums: return
+    db.drc_allocator.update_one({"_id": "drc"}, [{"$set": {"free": {"$sortArray": {"input": {"$setUnion": ["$free", nums]}, "sortBy": 1}}}}])
+
+def release_unused_drc_numbers(numbers):
+    """Recycles the numbers that no catalog group uses any more (deleted groups, unused reservations)."""
+    nums = {int(n) for n in numbers if n and int(n) >= DRC_START}
+    if not nums: return
+    still_used = set(catalog_groups().distinct("sort_index", {"sort_index": {"$in": list(nums)}}))
+    release_drc_numbers(nums - still_used)
+
+def get_next_free_drc_number():
+    """Returns the lowest free DRC number (recycled gap first)."""
+    return reserve_drc_numbers(1)[0]
+
+UPLOAD_CHUNK_SIZE = 1000
+
+# CSV column -> DB key for partial updates (empty cells are skipped)
+CATALOG_UPDATE_FIELDS = {
+    'product_name': 'product_name', 'mrp': 'mrp', 'selling_price': 'selling_price',
+    'stock': 'stock', 'image_link_1': 'image_link_1', 'gst_rate': 'gst_rate',
+    'variation': 'variation', 'color': 'color', 'fabric': 'fabric', 'hsn': 'hsn'
+}
+
+def build_catalog_doc(row, sku, size, group_id, sort_index, img1):
+    return {
+        "sku": sku,
+        "group_id": group_id,
+        "sort_index": sort_index,
+
+        # Core
+        "product_name": str(row.get('product_name', '')),
+        "image_link_1": img1,
+        "image_link_2": str(row.get('image_link_2', '')),
+        "image_link_3": str(row.get('image_link_3', '')),
+        "image_link_4": str(row.get('image_link_4', '')),
+        "color": str(row.get('color', '')),
+        "variation": size,
+        "gst_rate": safe_float(row.get('gst_rate')),
+        "hsn": str(row.get('hsn', '')),
+        "product_weight": str(row.get('product_weight', '')),
+        "fabric": str(row.get('fabric', '')),
+        "category": str(row.get('categories', 'Apparel')),
+        "ideal_for": str(row.get('ideal_for', '')),
+        "kids_weight": str(row.get('kids_weight', '')),
+        "brand_name": str(row.get('brand_name', 'Shine Arc')),
+
+        # Attributes
+        "description": str(row.get('product_description', '')),
+        "length": str(row.get('length', '')),
+        "fit_type": str(row.get('fit_type', '')),
+        "neck_type": str(row.get('neck_type', '')),
+        "occasion": str(row.get('occasion', '')),
+        "pattern": str(row.get('pattern', '')),
+        "sleeve_length": str(row.get('sleeve_length', '')),
+        "pack_of": str(row.get('pack_of', '1')),
+
+        # Financials
+        "mrp": safe_float(row.get('mrp')),
+        "selling_price": safe_float(row.get('selling_price')),
+        "stock": safe_int(row.get('stock')),
+
+        # Fixed
+        "country_origin": "India",
+        "manufacturer_name": "BnB Industries",
+        "manufacturer_address": "Siraspur, Delhi",
+        "manufacturer_pincode": "110042",
+        "last_updated": datetime.datetime.now()
+    }
+
+def build_catalog_update(row):
+    # Only update fields that are not empty in the CSV (Partial Update supported)
+    update_fields = {"last_updated": datetime.datetime.now()}
+    for csv_key, db_key in CATALOG_UPDATE_FIELDS.items():
+        val = row.get(csv_key)
+        if pd.notnull(val) and str(val).strip() != "":
+            if db_key in ['mrp', 'selling_price', 'gst_rate']:
+                update_fields[db_key] = safe_float(val)
+            elif db_key == 'stock':
+                update_fields[db_key] = safe_int(val)
+            else:
+                update_fields[db_key] = str(val)
+    return update_fields
+
+# --- GROUPED CATALOG ---
+# One `catalog_groups` document per group_id: the shared attributes once, plus a compact
+# `variants` array. A variant keeps only the per-SKU fields; group attributes that differ
+# for one SKU live in its `attrs` overrides. CATALOG_FLATTEN turns groups back into the flat
+# per-SKU rows the rest of the app (listing, downloads, marketplace exports) works with.
+# `h` is the variant's content hash (catalog_hash); partial updates clear it.
+CATALOG_VARIANT_FIELDS = ['sku', 'variation', 'mrp', 'selling_price', 'stock', 'last_updated', 'h']
+CATALOG_FIELDS = list(build_catalog_doc({}, "", "", "", 0, ""))  # flat column order
+CATALOG_HASH_FIELDS = [f for f in CATALOG_FIELDS if f not in ('sku', 'group_id', 'sort_index', 'last_updated')]
+GROUP_ATTRS_ONLY = {**{f"variants.{k}": 0 for k in CATALOG_VARIANT_FIELDS if k not in ('sku', 'h')}, "variants.attrs": 0}
+CATALOG_FLATTEN = [
+    {"$unwind": "$variants"},
+    {"$replaceRoot": {"newRoot": {"$mergeObjects": ["$$ROOT", {"$ifNull": ["$variants.attrs", {}]}, "$variants"]}}},
+    {"$project": {"_id": 0, "variants": 0, "attrs": 0, "h": 0}},
+]
+
+def catalog_hash(doc):
+    """Content hash of a flat catalog row; identity, placement and timestamp are left out."""
+    return hashlib.sha1(json.dumps([doc.get(k) for k in CATALOG_HASH_FIELDS], default=str).encode()).hexdigest()[:16]
+
+def split_catalog_doc(doc):
+    """Flat per-SKU doc -> (group attrs, variant)."""
+    variant = {k: doc[k] for k in CATALOG_VARIANT_FIELDS if k in doc}
+    return {k: v for k, v in doc.items() if k not in CATALOG_VARIANT_FIELDS and k != '_id'}, variant
+
+def variant_for_group(doc, group_attrs):
+    _, variant = split_catalog_doc(doc); variant['h'] = catalog_hash(doc)
+    over = {k: v for k, v in doc.items() if k not in CATALOG_VARIANT_FIELDS and k not in ('_id', 'group_id', 'sort_index') and group_attrs.get(k) != v}
+    if over: variant['attrs'] = over
+    return variant
+
+def group_doc(docs, group_id=None):
+    """Group document for flat docs of one group: each attribute takes its most common value
+    (ties -> first doc), so only the odd SKUs out carry overrides."""
+    attrs, _ = split_catalog_doc(docs[0])
+    for k in attrs:
+        values = [d[k] for d in docs if k in d]
+        attrs[k] = max(dict.fromkeys(values), key=values.count)
+    if 'sort_index' in attrs: attrs['sort_index'] = max(d.get('sort_index') or 0 for d in docs)  # the DRC parent's number
+    attrs['group_id'] = group_id or attrs.get('group_id')
+    return {"_id": attrs['group_id'], **attrs, "variants": [variant_for_group(d, attrs) for d in docs]}
+
+def migrate_catalog_to_groups(batch_size=UPLOAD_CHUNK_SIZE):
     """
-    # Clean headers
-    df.columns = [str(c).strip().lower().replace(" ", "_").replace(".", "").replace("%", "") for c in df.columns]
-    
-    success_count = 0
-    errors = []
-    reserved_ids_this_session = set() # To track IDs generated within this loop
-    
-    for index, row in df.iterrows():
-        action = str(row.get('action', '')).strip().lower()
-        
-        # Normalize SKU Logic
-        csv_sku = str(row.get('sku_code', '')).strip()
-        if not csv_sku or csv_sku.lower() == 'nan': csv_sku = None
-        
-        # Existing Product Check
-        existing_doc = None
+    Folds the flat `catalog` collection (one doc per SKU) into `catalog_groups`. Insert-only: a group
+    that already exists (and a SKU that already lives in another group) is left as it is, so a rerun
+    never reverts uploads made since. `catalog` is left untouched for rollback. Returns groups inserted.
+    """
+    def write(ops):
+        try: return db.catalog_groups.bulk_write(ops, ordered=False).upserted_count
+        except BulkWriteError as e:  # SKU moved to another group since the first run
+            log.warning("catalog migration: %s groups skipped (SKU already grouped)", len(e.details.get('writeErrors', [])))
+            return e.details.get('nUpserted', 0)
+    ops, written = [], 0
+    docs = db.catalog.find({}, {"_id": 0}).sort([("group_id", 1), ("sort_index", -1), ("sku", 1)])  # parent first; walks the catalog index, no in-memory sort
+    for gid, members in itertools.groupby(docs, key=lambda d: d.get('group_id') or d['sku']):
+        g = group_doc(list(members), gid)
+        ops.append(UpdateOne({"_id": gid}, {"$setOnInsert": {k: v for k, v in g.items() if k != "_id"}}, upsert=True))
+        if len(ops) >= batch_size: written += write(ops); ops = []
+    if ops: written += write(ops)
+    db.stats.update_one({"_id": "catalog_groups"}, {"$set": {"migrated_at": datetime.datetime.now(), "groups": written}}, upsert=True)
+    log.info("catalog migrated: %s groups", written)
+    return written
+
+_groups_ready = None  # database the migration check has passed for
+
+def catalog_groups():
+    """The grouped catalog collection; runs the one-time migration first if it never ran."""
+    global _groups_ready
+    current = get_db()
+    if _groups_ready is not current:
+        if not current.stats.find_one({"_id": "catalog_groups"}, {"_id": 1}): migrate_catalog_to_groups()
+        _groups_ready = current
+    return current.catalog_groups
+
+class CatalogChunkPlan:
+    """
+    In-memory view of one upload chunk. Every SKU ends up with at most one pending
+    write; flush() turns those into group-document writes sent as two unordered bulk_writes
+    (removals and in-place updates first, then additions, so a SKU that is deleted and
+    re-created never trips the unique variants.sku index).
+    """
+    def __init__(self, groups=()):
+        self.groups, self.members, self.group_of, self.hashes = {}, {}, {}, {}  # DB state: group attrs, group -> skus, sku -> group, sku -> h
+        for g in groups:
+            variants = g.pop('variants', []); skus = [v['sku'] for v in variants]
+            self.groups[g['_id']] = g; self.members[g['_id']] = set(skus)
+            self.group_of.update(dict.fromkeys(skus, g['_id']))
+            self.hashes.update((v['sku'], v.get('h')) for v in variants)
+        self.live = set(self.group_of)  # SKUs that exist once the pending writes land
+        self.pending = {}            # sku -> {"op": insert|replace|update|set|delete, "doc"/"fields", "rows"}
+        self.errors = []
+        self.success = 0
+        self.unchanged = 0
+
+    def error(self, row_no, sku, msg): self.errors.append({"Row": row_no, "SKU": sku, "Error": msg})
+
+    def create(self, row_no, doc):
+        sku = doc['sku']
+        if sku in self.live: return False
+        prev = self.pending.get(sku)
+        op = "replace" if prev and prev['op'] == "delete" else "insert"
+        self.pending[sku] = {"op": op, "doc": doc, "rows": (prev['rows'] if prev else []) + [row_no]}
+        self.live.add(sku); self.success += 1
+        return True
+
+    def update(self, row_no, sku, fields):
+        if sku not in self.live: return False
+        prev = self.pending.get(sku)
+        if prev and 'doc' in prev: prev['doc'].update(fields); prev['rows'].append(row_no)  # insert / replace / set (sync row)
+        elif prev: prev['fields'].update(fields); prev['rows'].append(row_no)
+        else: self.pending[sku] = {"op": "update", "fields": fields, "rows": [row_no]}
+        self.success += 1
+        return True
+
+    def current_group(self, sku):
+        p = self.pending.get(sku)
+        return p['doc']['group_id'] if p and 'doc' in p else self.group_of[sku]
+
+    def sync(self, row_no, doc):
+        """Full row for a live SKU (sync mode): written only when its content hash changed."""
+        sku = doc['sku']; prev = self.pending.get(sku)
+        if doc['group_id'] in self.groups: doc['sort_index'] = self.groups[doc['group_id']].get('sort_index', 0)
+        if prev:  # later row wins
+            prev['doc'] = doc; prev['rows'].append(row_no)
+            if prev['op'] == "update": prev['op'] = "set"
+            if prev['op'] == "set" and doc['group_id'] != self.group_of[sku]: prev['op'] = "replace"
+        elif self.hashes.get(sku) == catalog_hash(doc) and doc['group_id'] == self.group_of[sku]:
+            self.unchanged += 1
+        else:
+            self.pending[sku] = {"op": "set" if doc['group_id'] == self.group_of[sku] else "replace", "doc": doc, "rows": [row_no]}
+        self.success += 1
+
+    def delete(self, row_no, sku):
+        if sku not in self.live: return False
+        prev = self.pending.get(sku)
+        if prev and prev['op'] == "insert": del self.pending[sku]   # never reached the DB
+        else: self.pending[sku] = {"op": "delete", "rows": (prev['rows'] if prev else []) + [row_no]}
+        self.live.discard(sku); self.success += 1
+        return True
+
+    def drop(self, sku, msg):
+        """Withdraws a pending write (e.g. a late collision) and turns its rows into errors."""
+        p = self.pending.pop(sku)
+        for r in p['rows']: self.error(r, sku, msg)
+        self.success -= len(p['rows'])
+
+    def shared_fields(self, group_id, skus):
+        """Group attributes that every variant of the group is being updated to the same value."""
+        if set(skus) != self.members.get(group_id): return {}
+        first, rest = self.pending[skus[0]]['fields'], [self.pending[s]['fields'] for s in skus[1:]]
+        return {k: v for k, v in first.items() if k not in CATALOG_VARIANT_FIELDS and all(k in f and f[k] == v for f in rest)}
+
+    def operations(self):
+        """-> (first, second): lists of (operation, skus it carries)."""
+        first, second, updates, sets, adds = [], [], {}, {}, {}
+        for sku, p in self.pending.items():
+            if p['op'] in ("delete", "replace"): first.append((UpdateOne({"_id": self.group_of[sku]}, {"$pull": {"variants": {"sku": sku}}}), [sku]))
+            if p['op'] in ("insert", "replace"): adds.setdefault(p['doc']['group_id'], []).append(sku)
+            if p['op'] == "update": updates.setdefault(self.group_of[sku], []).append(sku)
+            if p['op'] == "set": sets.setdefault(self.group_of[sku], []).append(sku)
+        for g, skus in updates.items():
+            shared = self.shared_fields(g, skus)
+            if shared:  # whole group changed: store once, drop the per-variant overrides
+                first.append((UpdateOne({"_id": g}, {"$set": shared, "$unset": {"variants.$[].h": "", **{f"variants.$[].attrs.{k}": "" for k in shared}}}), skus))
+                self.groups[g].update(shared)
+            for sku in skus:
+                fields = {(f"variants.$.{k}" if k in CATALOG_VARIANT_FIELDS else f"variants.$.attrs.{k}"): v for k, v in self.pending[sku]['fields'].items() if k not in shared}
+                if fields: first.append((UpdateOne({"_id": g, "variants.sku": sku}, {"$set": fields, "$unset": {"variants.$.h": ""}}), [sku]))
+        for g, skus in sets.items():
+            if set(skus) == self.members[g]:  # every variant rewritten: rebuild the group document
+                new = group_doc([self.pending[s]['doc'] for s in skus])
+                first.append((ReplaceOne({"_id": g}, new), skus)); self.groups[g] = {k: v for k, v in new.items() if k != 'variants'}
+            else:
+                first.extend((UpdateOne({"_id": g, "variants.sku": s}, {"$set": {"variants.$": variant_for_group(self.pending[s]['doc'], self.groups[g])}}), [s]) for s in skus)
+        for g, skus in adds.items():
+            docs = [self.pending[s]['doc'] for s in skus]
+            if g in self.groups: second.append((UpdateOne({"_id": g}, {"$push": {"variants": {"$each": [variant_for_group(d, self.groups[g]) for d in docs]}}}), skus))
+            else: second.append((InsertOne(group_doc(docs)), skus))
+        return first, second
+
+    def flush(self):
+        failed = {}
+        for batch in self.operations():
+            if not batch: continue
+            try: catalog_groups().bulk_write([op for op, _ in batch], ordered=False)
+            except BulkWriteError as e:
+                for w in e.details.get('writeErrors', []):
+                    for sku in batch[w['index']][1]: failed.setdefault(sku, w.get('errmsg', 'unknown'))
+        emptied = {self.group_of[s] for s, p in self.pending.items() if p['op'] in ("delete", "replace")}
+        if emptied: catalog_groups().delete_many({"_id": {"$in": list(emptied)}, "variants": {"$size": 0}})
+        for sku, msg in failed.items():
+            rows = self.pending[sku]['rows']
+            for r in rows: self.error(r, sku, f"Write failed: {msg}")
+            self.success -= len(rows)
+
+# --- UPLOAD INGEST ---
+# Uploads are read as all-string chunks and cleaned column-wise once; the row loop then only
+# assembles documents. Blank numeric cells stay NaN (= "not given" for partial updates).
+CATALOG_FLOAT_COLS = ['mrp', 'selling_price', 'gst_rate']
+CATALOG_INT_COLS = ['stock']
+CATALOG_HEADER_ALIASES = {'sku': 'sku_code', 'description': 'product_description', 'category': 'categories'}  # get_catalog_df names
+
+def normalize_headers(columns):
+    """'GST Rate %' -> 'gst_rate', 'Image Link 1' -> 'image_link_1'."""
+    return pd.Index(columns).astype(str).str.strip().str.lower().str.replace(" ", "_").str.replace(".", "", regex=False).str.replace("%", "").str.strip("_")
+
+def read_catalog_csv(source, chunksize=UPLOAD_CHUNK_SIZE):
+    """Iterator of raw all-string frames; the row index runs on across chunks."""
+    return pd.read_csv(source, dtype=str, keep_default_na=False, chunksize=chunksize)
+
+def clean_catalog_frame(df):
+    """Vectorized cleanup of one upload frame: headers, blanks, numbers, and the _action/_sku/_img helper columns."""
+    df = df.where(df.notna(), "").astype(str); df.columns = normalize_headers(df.columns)
+    df = df.rename(columns={a: b for a, b in CATALOG_HEADER_ALIASES.items() if b not in df.columns})  # re-uploaded live catalog
+    for c in df.columns: df[c] = df[c].str.strip()
+    for c in CATALOG_FLOAT_COLS + CATALOG_INT_COLS:
+        if c not in df.columns: continue
+        raw = df[c]; blank = raw.eq("") | raw.str.lower().eq("nan")
+        digits = raw.str.replace(r"[₹,%]", "", regex=True).str.strip() if c in CATALOG_FLOAT_COLS else raw.str.replace(",", "", regex=False).str.split(".").str[0].str.strip()
+        num = pd.to_numeric(digits, errors="coerce").astype(float)
+        df[c] = num.where(blank | num.notna(), 0.0).where(~blank)  # unparseable -> 0 (as before), blank -> NaN
+    blank = lambda s: s.eq("") | s.str.lower().eq("nan")
+    df['_action'] = text_col(df, 'action').str.lower()
+    sku = text_col(df, 'sku_code'); df['_sku'] = sku.where(~blank(sku), "")
+    df['_img'] = ~blank(text_col(df, 'image_link_1'))
+    return df
+
+def iter_frame_chunks(df, chunk_size):
+    for start in range(0, len(df), chunk_size): yield df.iloc[start:start + chunk_size]
+
+def text_col(df, col):
+    return df[col].astype(str).str.strip() if col in df.columns else pd.Series("", index=df.index)
+
+def count_drc_candidates(rows, live, sync=False):
+    """New-product rows of a chunk that will draw a DRC number: no Group ID, an image, and (after the prefetch)
+    no SKU that already exists - a duplicate when uploading, an existing group to reuse when syncing."""
+    n = 0
+    for row_no, row, action, csv_sku, variations, user_group, named in rows:
+        if action in ('update', 'delete') or user_group or not row['_img']: continue
+        if sync and any(s in live for s in named): continue
+        if not sync and csv_sku in live: continue
+        n += 1
+    return n
+
+def upload_catalog_chunk(chunk, sync=False):
+    """Processes one cleaned chunk (see clean_catalog_frame). Returns (success_count, errors, unchanged_count).
+    sync: rows without an Action whose SKUs exist are compared by content hash and rewritten only if they changed."""
+    rows = []
+    for index, row in zip(chunk.index, chunk.to_dict("records")):
+        variations = [v.strip() for v in row.get('variation', '').split(',') if v.strip()] or ["Free"]
+        csv_sku = row['_sku'] or None
+        user_group = str(row.get('group_id', '')).strip()
+        if user_group.lower() == 'nan': user_group = ''
+        # SKUs the row names without a DRC number (None = generated from the group)
+        if csv_sku: named = [f"{csv_sku}-{size}" if len(variations) > 1 else csv_sku for size in variations]
+        else: named = [f"{user_group}-{size}" if user_group else None for size in variations]
+        rows.append((index + 2, row, row['_action'], csv_sku, variations, user_group, named))
+
+    # One round trip: every SKU this chunk can reference without allocating a DRC number
+    # (and every group a row names), fetched as group attributes + variant SKUs
+    wanted, user_groups = set(), set()
+    for row_no, row, action, csv_sku, variations, user_group, named in rows:
+        if action not in ('update', 'delete') and user_group: user_groups.add(user_group)
         if csv_sku:
-            existing_doc = db.catalog.find_one({"sku": csv_sku})
+            wanted.add(csv_sku)
+            if action not in ('update', 'delete') and len(variations) > 1: wanted.update(f"{csv_sku}-{s}" for s in variations)
+        elif action not in ('update', 'delete') and user_group: wanted.update(f"{user_group}-{s}" for s in variations)
+    q = ([{"variants.sku": {"$in": list(wanted)}}] if wanted else []) + ([{"_id": {"$in": list(user_groups)}}] if user_groups else [])
+    plan = CatalogChunkPlan(catalog_groups().find({"$or": q}, GROUP_ATTRS_ONLY) if q else [])
+    unverified = set()  # Generated SKUs whose DB existence is not known yet
 
-        # --- LOGIC BRANCHING ---
+    # One reservation for every DRC number the chunk needs; rows that only need one because an earlier
+    # row deleted their SKU draw singly. Whatever no group ends up using is released below.
+    drawn = reserve_drc_numbers(count_drc_candidates(rows, plan.live, sync)); drc_pool = deque(drawn)
 
+    for row_no, row, action, csv_sku, variations, user_group, named in rows:
         # 1. DELETE ACTION
         if action == 'delete':
-            if existing_doc:
-                db.catalog.delete_one({"sku": csv_sku})
-                success_count += 1
-            else:
-                errors.append({"Row": index+2, "SKU": csv_sku, "Error": "Cannot Delete: SKU not found"})
-            continue
+            if not plan.delete(row_no, csv_sku): plan.error(row_no, csv_sku, "Cannot Delete: SKU not found")
 
         # 2. UPDATE ACTION
         elif action == 'update':
-            if existing_doc:
-                # Prepare update payload (Partial Update supported)
-                update_fields = {"last_updated": datetime.datetime.now()}
-                
-                # Only update fields that are not empty in the CSV
-                # Map CSV columns to DB keys
-                field_map = {
-                    'product_name': 'product_name', 'mrp': 'mrp', 'selling_price': 'selling_price',
-                    'stock': 'stock', 'image_link_1': 'image_link_1', 'gst_rate': 'gst_rate',
-                    'variation': 'variation', 'color': 'color', 'fabric': 'fabric', 'hsn': 'hsn'
-                    # Add others as needed, keeping it lightweight for speed
-                }
-                
-                for csv_key, db_key in field_map.items():
-                    val = row.get(csv_key)
-                    if pd.notnull(val) and str(val).strip() != "":
-                        if db_key in ['mrp', 'selling_price', 'gst_rate']:
-                            update_fields[db_key] = safe_float(val)
-                        elif db_key == 'stock':
-                            update_fields[db_key] = safe_int(val)
-                        else:
-                            update_fields[db_key] = str(val)
-
-                db.catalog.update_one({"sku": csv_sku}, {"$set": update_fields})
-                success_count += 1
-            else:
-                errors.append({"Row": index+2, "SKU": csv_sku, "Error": "Cannot Update: SKU not found"})
-            continue
+            if not plan.update(row_no, csv_sku, build_catalog_update(row)): plan.error(row_no, csv_sku, "Cannot Update: SKU not found")
 
         # 3. NEW UPLOAD (No Action Specified)
         else:
             # Check for Duplicate
-            if existing_doc:
-                errors.append({"Row": index+2, "SKU": csv_sku, "Error": "Duplicate Product. Use 'Update' in Action column to modify."})
-                continue
-            
-            # --- NEW PRODUCT CREATION LOGIC ---
-            
+            if csv_sku and csv_sku in plan.live and not sync:
+                plan.error(row_no, csv_sku, "Duplicate Product. Use 'Update' in Action column to modify."); continue
+
             # Image Check
-            img1 = str(row.get('image_link_1', ''))
-            if not img1 or img1.lower() == 'nan':
-                errors.append({"Row": index+2, "SKU": "New", "Error": "Image Link 1 is Mandatory"})
-                continue
-
-            # Generate Group ID (Recycled)
-            user_group = str(row.get('group_id', '')).strip()
-            
-            # If user didn't provide Group ID, we need to generate one
-            # We must be careful: If this row belongs to a variation set in the CSV, they need the SAME ID.
-            # Ideally, the user provides Group ID. If not, we generate based on recycling.
-            
-            if user_group and user_group.lower() != 'nan':
+            if not row['_img']:
+                plan.error(row_no, "New", "Image Link 1 is Mandatory"); continue
+            img1 = row['image_link_1']
+
+            # When syncing, the named SKUs that are live are refreshed
+            known = {s for s in named if s in plan.live} if sync else set()
+
+            # Generate Group ID (Recycled) unless the user provided one (or, syncing, the SKUs already have one)
+            if user_group:
                 group_id = user_group
                 current_sort_index = 0 # Not a primary parent
+            elif known:
+                group_id = plan.current_group(next(s for s in named if s in known))
+                current_sort_index = 0
             else:
-                # Get recycled number
-                current_sort_index = get_next_free_drc_number(reserved_indices=reserved_ids_this_session)
+                if not drc_pool: drawn.append(get_next_free_drc_number()); drc_pool.append(drawn[-1])
+                current_sort_index = drc_pool.popleft()
                 group_id = f"DRC{current_sort_index}"
-                reserved_ids_this_session.add(current_sort_index)
 
             # Variations Exploder
-            raw_vars = str(row.get('variation', '')).split(',')
-            variations = [v.strip() for v in raw_vars if v.strip()]
-            if not variations: variations = ["Free"]
-            
-            for size in variations:
-                # SKU Generation
-                if csv_sku:
-                    final_sku = f"{csv_sku}-{size}" if len(variations) > 1 else csv_sku
-                else:
-                    final_sku = f"{group_id}-{size}"
-                
-                # Double check if this specific generated SKU exists (Collision check)
-                if db.catalog.find_one({"sku": final_sku}):
-                    errors.append({"Row": index+2, "SKU": final_sku, "Error": "Generated SKU already exists"})
-                    continue
-
-                product_doc = {
-                    "sku": final_sku,
-                    "group_id": group_id,
-                    "sort_index": current_sort_index,
-                    
-                    # Core
-                    "product_name": str(row.get('product_name', '')),
-                    "image_link_1": img1,
-                    "image_link_2": str(row.get('image_link_2', '')),
-                    "image_link_3": str(row.get('image_link_3', '')),
-                    "image_link_4": str(row.get('image_link_4', '')),
-                    "color": str(row.get('color', '')),
-                    "variation": size,
-                    "gst_rate": safe_float(row.get('gst_rate')),
-                    "hsn": str(row.get('hsn', '')),
-                    "product_weight": str(row.get('product_weight', '')),
-                    "fabric": str(row.get('fabric', '')),
-                    "category": str(row.get('categories', 'Apparel')),
-                    "ideal_for": str(row.get('ideal_for', '')),
-                    "kids_weight": str(row.get('kids_weight', '')),
-                    "brand_name": str(row.get('brand_name', 'Shine Arc')),
-                    
-                    # Attributes
-                    "description": str(row.get('product_description', '')),
-                    "length": str(row.get('length', '')),
-                    "fit_type": str(row.get('fit_type', '')),
-                    "neck_type": str(row.get('neck_type', '')),
-                    "occasion": str(row.get('occasion', '')),
-                    "pattern": str(row.get('pattern', '')),
-                    "sleeve_length": str(row.get('sleeve_length', '')),
-                    "pack_of": str(row.get('pack_of', '1')),
-                    
-                    # Financials
-                    "mrp": safe_float(row.get('mrp')),
-                    "selling_price": safe_float(row.get('selling_price')),
-                    "stock": safe_int(row.get('stock')),
-
-                    # Fixed
-                    "country_origin": "India",
-                    "manufacturer_name": "BnB Industries",
-                    "manufacturer_address": "Siraspur, Delhi",
-                    "manufacturer_pincode": "110042",
-                    "last_updated": datetime.datetime.now()
-                }
-                
-                db.catalog.insert_one(product_doc)
-                success_count += 1
+            for size, named_sku in zip(variations, named):
+                final_sku = named_sku or f"{group_id}-{size}"
+                if final_sku in known: plan.sync(row_no, build_catalog_doc(row, final_sku, size, group_id, current_sort_index, img1)); continue
+                if not plan.create(row_no, build_catalog_doc(row, final_sku, size, group_id, current_sort_index, img1)):
+                    plan.error(row_no, final_sku, "Generated SKU already exists")
+                elif final_sku not in wanted: unverified.add(final_sku)
+
+    # Collision check for freshly generated DRC SKUs (second round trip only when needed)
+    if unverified:
+        for g in catalog_groups().find({"variants.sku": {"$in": list(unverified)}}, {"_id": 0, "variants.sku": 1}):
+            for v in g['variants']:
+                if v['sku'] in unverified and v['sku'] in plan.pending: plan.drop(v['sku'], "Generated SKU already exists")
 
+    # Groups emptied by deletes, and drawn numbers whose rows failed or were never reached, go back to the allocator
+    freed = [plan.groups[plan.group_of[sku]].get('sort_index', 0) for sku, p in plan.pending.items() if p['op'] in ("delete", "replace")]
+    plan.flush()
+    release_unused_drc_numbers(freed + drawn)
+    return plan.success, sorted(plan.errors, key=lambda e: e['Row']), plan.unchanged
+
+def bulk_upload_catalog(data, chunk_size=UPLOAD_CHUNK_SIZE, on_chunk=None, sync=False):
+    """
+    Smart Uploader with Duplicate Check, Updates, Deletions, and ID Recycling.
+    `data` is a DataFrame or an iterator of raw chunks (read_catalog_csv), so memory stays bounded.
+    sync=True takes a full catalog CSV: existing SKUs are diffed by content hash and only changed
+    rows are written, so `last_updated` moves on real edits only.
+    Each chunk: vectorized cleanup, one `$in` prefetch, one DRC reservation, in-memory conflict
+    resolution, two unordered bulk_writes against catalog_groups. `on_chunk(stats)` receives per-chunk timing.
+    Returns: (success_count, error_df); unchanged rows count as successes.
+    """
+    chunks = iter_frame_chunks(data, chunk_size) if isinstance(data, pd.DataFrame) else data
+    success_count = 0
+    errors = []
+    for n, raw in enumerate(chunks, 1):
+        t0 = time.perf_counter()
+        chunk = clean_catalog_frame(raw)
+        ok, errs, same = upload_catalog_chunk(chunk, sync)
+        success_count += ok; errors.extend(errs)
+        stats = {"chunk": n, "rows": len(chunk), "success": ok, "unchanged": same, "errors": len(errs), "seconds": round(time.perf_counter() - t0, 3)}
+        log.info("catalog upload chunk %(chunk)s: %(rows)s rows, %(success)s ok (%(unchanged)s unchanged), %(errors)s errors in %(seconds)ss", stats)
+        if on_chunk: on_chunk(stats)
     return success_count, pd.DataFrame(errors)
 
 def get_catalog_df():
-    data = list(db.catalog.find({}, {"_id": 0}))
-    return pd.DataFrame(data) if data else pd.DataFrame()
-
-def generate_marketplace_file(platform):
-    catalog = list(db.catalog.find({}, {"_id": 0}))
-    if not catalog: return None
-    df = pd.DataFrame(catalog)
-    for col in ['sku', 'product_name', 'mrp', 'selling_price', 'stock']:
-        if col not in df.columns: df[col] = ""
-
-    if platform == "Meesho":
-        export_df = pd.DataFrame()
-        export_df['Image Link 1'] = df.get('image_link_1', '')
-        export_df['Image Link 2'] = df.get('image_link_2', '')
-        export_df['Image Link 3'] = df.get('image_link_3', '')
-        export_df['Image Link 4'] = df.get('image_link_4', '')
-        export_df['Sku Code'] = df.get('sku', '')
-        export_df['Product Name'] = df.get('product_name', '')
-        export_df['Color'] = df.get('color', '')
-        export_df['Variation'] = df.get('variation', '')
-        export_df['GST Rate'] = df.get('gst_rate', '')
-        export_df['HSN'] = df.get('hsn', '')
-        export_df['Product Weight'] = df.get('product_weight', '')
-        export_df['Fabric'] = df.get('fabric', '')
-        export_df['Categories'] = df.get('category', '')
-        export_df['Ideal For'] = df.get('ideal_for', '')
-        export_df['Kids Weight'] = df.get('kids_weight', '')
-        export_df['Brand Name'] = df.get('brand_name', 'Shine Arc')
-        export_df['Group Id'] = df.get('group_id', '')
-        export_df['Product Description'] = df.get('description', '')
-        export_df['Length'] = df.get('length', '')
-        export_df['Fit Type'] = df.get('fit_type', '')
-        export_df['Neck Type'] = df.get('neck_type', '')
-        export_df['Occasion'] = df.get('occasion', '')
-        export_df['Pattern'] = df.get('pattern', '')
-        export_df['Sleeve Length'] = df.get('sleeve_length', '')
-        export_df['Pack Of'] = df.get('pack_of', '')
-        export_df['Country Origin'] = "India"
-        export_df['Manufacturer Name'] = "BnB Industries"
-        export_df['Manufacturer Address'] = "Siraspur, Delhi"
-        export_df['Manufacturer Pin Code'] = "110042"
-        export_df['MRP'] = df.get('mrp', 0)
-        export_df['Selling Price'] = df.get('selling_price', 0)
-        
-    elif platform == "Flipkart":
-        export_df = pd.DataFrame()
-        export_df['Seller_SKU'] = df['sku']
-        export_df['Group_ID'] = df.get('group_id', '')
-        export_df['MRP'] = df['mrp']
-        export_df['Your_Selling_Price'] = df['selling_price']
-        export_df['Stock'] = df['stock']
-        export_df['Main_Img_URL'] = df.get('image_link_1', '')
-        
-    elif platform == "Amazon":
-        export_df = pd.DataFrame()
-        export_df['item_sku'] = df['sku']
-        export_df['item_name'] = df['product_name']
-        export_df['standard_price'] = df['selling_price']
-        export_df['quantity'] = df['stock']
-        export_df['main_image_url'] = df.get('image_link_1', '')
-
-    else: return df 
-    return export_df
+    """Flat per-SKU rows (CATALOG_FLATTEN), group by group, in the pre-grouping column order."""
+    data = list(catalog_groups().aggregate([{"$sort": {"_id": 1}}, *CATALOG_FLATTEN]))
+    if not data: return pd.DataFrame()
+    df = pd.DataFrame(data)
+    return df[[c for c in CATALOG_FIELDS if c in df.columns] + [c for c in df.columns if c not in CATALOG_FIELDS]]
+
+# --- CATALOG QUERY API ---
+CATALOG_PAGE_SIZE = 50
+CATALOG_LIST_FIELDS = ['image_link_1', 'sku', 'product_name', 'variation', 'color', 'mrp', 'selling_price', 'group_id']
+CATALOG_DEFAULT_SORT = [("sort_index", 1)]  # group-level keys; group _id and then sku break ties
+
+def catalog_filter(filters=None, search=""):
+    """filters: group_id / color / variation (value or list), min_price / max_price (selling_price), in_stock."""
+    f = filters or {}; q = {}
+    for k in ("group_id", "color", "variation"):
+        v = f.get(k)
+        if v: q[k] = {"$in": list(v)} if isinstance(v, (list, tuple, set)) else v
+    price = {}
+    if f.get("min_price") is not None: price["$gte"] = float(f["min_price"])
+    if f.get("max_price") is not None: price["$lte"] = float(f["max_price"])
+    if price: q["selling_price"] = price
+    if f.get("in_stock"): q["stock"] = {"$gt": 0}
+    if search and search.strip(): q["$text"] = {"$search": search.strip()}  # catalog_text index
+    return q
+
+def keyset_clause(sort, after):
+    """Rows strictly after `after` (values of the sort keys, in order) for a compound sort."""
+    ors = []
+    for i, (field, direction) in enumerate(sort):
+        clause = {sort[j][0]: after[j] for j in range(i)}
+        clause[field] = {"$gt" if direction == 1 else "$lt": after[i]}
+        ors.append(clause)
+    return {"$or": ors}
+
+def variant_cond(q):
+    """$filter condition on $$v (a variant of the current group) equivalent to `q` on its flattened row:
+    variant fields, else the variant's attrs override, else the group value."""
+    def val(k):
+        if k == "group_id": return "$_id"
+        if k in CATALOG_VARIANT_FIELDS: return f"$$v.{k}"
+        return {"$cond": [{"$eq": [{"$type": f"$$v.attrs.{k}"}, "missing"]}, f"${k}", f"$$v.attrs.{k}"]}
+    conds = []
+    for k, c in q.items():
+        for op, x in (c.items() if isinstance(c, dict) else [("$eq", c)]):
+            if op == "$in": conds.append({"$in": [val(k), list(x)]})
+            elif op == "$eq": conds.append({"$eq": [val(k), x]})
+            else: conds += [{"$gt": [val(k), None]}, {op: [val(k), x]}]  # range: null/missing never matches (as in find)
+    return {"$and": conds}
+
+def catalog_page_plan(filters=None, search="", sort=None):
+    """-> (group filter, group sort, kept-variants expression); shared by query_catalog and the plan audit."""
+    q = catalog_filter(filters, search)
+    # Narrow groups on their indexes; the kept-variants expression then filters rows exactly
+    pre = {"$text": q.pop("$text")} if "$text" in q else {}
+    for k, v in q.items():
+        if k == "group_id": pre["_id"] = v
+        elif k not in CATALOG_VARIANT_FIELDS: pre.setdefault("$and", []).append({"$or": [{k: v}, {f"variants.attrs.{k}": v}]})
+    per_variant = {k: v for k, v in q.items() if k in CATALOG_VARIANT_FIELDS}
+    if per_variant: pre["variants"] = {"$elemMatch": per_variant}
+    gsort = [("_id" if k == "group_id" else k, d) for k, d in (sort or CATALOG_DEFAULT_SORT)]
+    if gsort[-1][0] != "_id": gsort.append(("_id", 1))  # _id is unique, so the group order is total
+    keep = {"$filter": {"input": "$variants", "as": "v", "cond": variant_cond(q)}} if q else "$variants"
+    return pre, gsort, keep
+
+def catalog_page_groups(pre, gsort, keep):
+    """Pass 1 of a catalog page: matching-row count per group, in page order, straight off the sort index."""
+    return [{"$match": pre}, {"$sort": dict(gsort)}, {"$project": {"n": {"$size": keep}}}, {"$match": {"n": {"$gt": 0}}}]
+
+def query_catalog(filters=None, search="", projection=None, sort=None, skip=0, limit=CATALOG_PAGE_SIZE, after=None):
+    """
+    One page of the catalog plus the total match count -> (df, total).
+    Rows come group by group in `sort` order (group-level fields, default sort_index; then group _id),
+    variants by sku within a group. The page is cut at group level, walking the (sort_index, _id)
+    indexes without unwinding anything; only the page's groups are then fetched and flattened.
+    Page by skip/limit (rows), or pass `after` = the last row's (sort-key values..., group_id, sku) for keyset paging.
+    """
+    pre, gsort, keep = catalog_page_plan(filters, search, sort)
+    fields = list(projection or CATALOG_LIST_FIELDS)
+    res = next(catalog_groups().aggregate([{"$match": pre}, {"$group": {"_id": None, "n": {"$sum": {"$size": keep}}}}]), None)
+    total = res['n'] if res else 0
+    last = after[-2] if after is not None else None  # group of the last row seen: only its later skus are left
+    if after is not None: pre = {"$and": [pre, {"$or": [keyset_clause(gsort, list(after[:-1])), {"_id": last}]}]}
+    start = int(skip) if after is None else 0
+    ids, before, counted = [], 0, 0
+    with catalog_groups().aggregate(catalog_page_groups(pre, gsort, keep)) as cur:
+        for g in cur:
+            if g['_id'] == last: ids.append(last); continue  # remaining rows unknown: not counted towards the page
+            if not ids and before + g['n'] <= start: before += g['n']; continue  # wholly before the page
+            ids.append(g['_id']); counted += g['n']
+            if counted - (start - before) >= limit: break
+    if not ids: return pd.DataFrame(columns=fields), total
+    # Pass 2: only the page's groups, flattened; rows ordered by group position, then sku
+    rows = catalog_groups().aggregate([{"$match": {"_id": {"$in": ids}}}, {"$set": {"variants": keep, "_g": {"$indexOfArray": [ids, "$_id"]}}},
+                                       *CATALOG_FLATTEN, {"$project": {"_g": 1, "sku": 1, **{k: 1 for k in fields}}}])
+    rows = sorted(rows, key=lambda r: (r['_g'], r['sku']))
+    rows = [r for r in rows if ids[r['_g']] != last or r['sku'] > after[-1]] if after is not None else rows[start - before:]
+    return pd.DataFrame(rows[:int(limit)], columns=fields), total
+
+# --- MARKETPLACE TEMPLATES ---
+# platform -> [(column header, catalog field, default)]. field None = fixed value for every row.
+# Only the referenced fields are projected out of MongoDB.
+MARKETPLACE_TEMPLATES = {
+    "Meesho": [
+        ("Image Link 1", "image_link_1", ""), ("Image Link 2", "image_link_2", ""), ("Image Link 3", "image_link_3", ""), ("Image Link 4", "image_link_4", ""),
+        ("Sku Code", "sku", ""), ("Product Name", "product_name", ""), ("Color", "color", ""), ("Variation", "variation", ""),
+        ("GST Rate", "gst_rate", ""), ("HSN", "hsn", ""), ("Product Weight", "product_weight", ""), ("Fabric", "fabric", ""),
+        ("Categories", "category", ""), ("Ideal For", "ideal_for", ""), ("Kids Weight", "kids_weight", ""), ("Brand Name", "brand_name", "Shine Arc"),
+        ("Group Id", "group_id", ""), ("Product Description", "description", ""), ("Length", "length", ""), ("Fit Type", "fit_type", ""),
+        ("Neck Type", "neck_type", ""), ("Occasion", "occasion", ""), ("Pattern", "pattern", ""), ("Sleeve Length", "sleeve_length", ""),
+        ("Pack Of", "pack_of", ""), ("Country Origin", None, "India"), ("Manufacturer Name", None, "BnB Industries"),
+        ("Manufacturer Address", None, "Siraspur, Delhi"), ("Manufacturer Pin Code", None, "110042"),
+        ("MRP", "mrp", 0), ("Selling Price", "selling_price", 0),
+    ],
+    "Flipkart": [
+        ("Seller_SKU", "sku", ""), ("Group_ID", "group_id", ""), ("MRP", "mrp", 0), ("Your_Selling_Price", "selling_price", 0),
+        ("Stock", "stock", 0), ("Main_Img_URL", "image_link_1", ""),
+    ],
+    "Amazon": [
+        ("item_sku", "sku", ""), ("item_name", "product_name", ""), ("standard_price", "selling_price", 0),
+        ("quantity", "stock", 0), ("main_image_url", "image_link_1", ""),
+    ],
+    "Myntra": [
+        ("Vendor SKU Code", "sku", ""), ("Style Group Id", "group_id", ""), ("Product Display Name", "product_name", ""), ("Brand", "brand_name", "Shine Arc"),
+        ("Article Type", "category", ""), ("Colour", "color", ""), ("Size", "variation", ""), ("Fabric", "fabric", ""),
+        ("HSN", "hsn", ""), ("GST Rate", "gst_rate", ""), ("MRP", "mrp", 0), ("Selling Price", "selling_price", 0), ("Inventory", "stock", 0),
+        ("Front Image", "image_link_1", ""), ("Back Image", "image_link_2", ""), ("Side Image", "image_link_3", ""), ("Detail Image", "image_link_4", ""),
+        ("Product Details", "description", ""), ("Country Of Origin", None, "India"), ("Manufacturer Name And Address", None, "BnB Industries, Siraspur, Delhi 110042"),
+    ],
+    "Ajio": [
+        ("Seller SKU", "sku", ""), ("Style Code", "group_id", ""), ("Product Name", "product_name", ""), ("Brand", "brand_name", "Shine Arc"),
+        ("Color", "color", ""), ("Size", "variation", ""), ("Fabric", "fabric", ""), ("Pattern", "pattern", ""), ("Sleeve Length", "sleeve_length", ""),
+        ("Neck", "neck_type", ""), ("HSN", "hsn", ""), ("MRP", "mrp", 0), ("Selling Price", "selling_price", 0), ("Inventory", "stock", 0),
+        ("Image URL 1", "image_link_1", ""), ("Image URL 2", "image_link_2", ""), ("Image URL 3", "image_link_3", ""), ("Image URL 4", "image_link_4", ""),
+        ("Description", "description", ""), ("Country Of Origin", None, "India"),
+    ],
+}
+EXPORT_CHUNK_SIZE = 5000
+# Changed-only exports pick up rows edited since the platform's last export. The window
+# starts a little before the watermark so edits committed while that export ran are not lost.
+EXPORT_WATERMARK_OVERLAP = datetime.timedelta(minutes=5)
+
+def template_frame(template, docs):
+    src = pd.DataFrame(docs)
+    out = pd.DataFrame(index=src.index)
+    for header, field, default in template:
+        out[header] = src[field].fillna(default) if field in src.columns else default
+    return out
+
+def iter_marketplace_chunks(platform, chunk_size=EXPORT_CHUNK_SIZE, since=None):
+    """Yields export DataFrames of at most chunk_size rows straight off a server-side cursor (one group after another).
+    since: only SKUs whose last_updated is later."""
+    template = MARKETPLACE_TEMPLATES[platform]
+    projection = {field: 1 for _, field, _ in template if field}
+    pipeline = [{"$sort": {"_id": 1}}, *CATALOG_FLATTEN]
+    if since: pipeline = [{"$match": {"variants.last_updated": {"$gt": since}}}, *pipeline, {"$match": {"last_updated": {"$gt": since}}}]
+    pipeline.append({"$project": projection})
+    buf = []
+    for doc in catalog_groups().aggregate(pipeline, batchSize=chunk_size):
+        buf.append(doc)
+        if len(buf) >= chunk_size: yield template_frame(template, buf); buf = []
+    if buf: yield template_frame(template, buf)
+
+def get_export_watermark(platform):
+    doc = db.export_watermarks.find_one({"_id": platform})
+    return doc['exported_at'] if doc else None
+
+def set_export_watermark(platform, exported_at):
+    db.export_watermarks.update_one({"_id": platform}, {"$set": {"exported_at": exported_at}}, upsert=True)
+
+def export_since(platform, changed_only):
+    """Start of the changed-only window, or None for a full export (also when the platform was never exported)."""
+    mark = get_export_watermark(platform) if changed_only else None
+    return mark - EXPORT_WATERMARK_OVERLAP if mark else None
+
+def write_marketplace_file(platform, out, fmt="csv", chunk_size=EXPORT_CHUNK_SIZE, since=None):
+    """Streams a platform export into a binary file object chunk by chunk. Returns rows written."""
+    headers = [h for h, _, _ in MARKETPLACE_TEMPLATES[platform]]
+    rows = 0
+    if fmt == "xlsx":
+        from openpyxl import Workbook  # only needed for Excel exports
+        wb = Workbook(write_only=True); ws = wb.create_sheet(platform); ws.append(headers)
+        for chunk in iter_marketplace_chunks(platform, chunk_size, since):
+            for r in chunk.itertuples(index=False, name=None): ws.append(list(r))
+            rows += len(chunk)
+        wb.save(out)
+    else:
+        out.write(pd.DataFrame(columns=headers).to_csv(index=False).encode('utf-8'))
+        for chunk in iter_marketplace_chunks(platform, chunk_size, since):
+            out.write(chunk.to_csv(index=False, header=False).encode('utf-8')); rows += len(chunk)
+    return rows
+
+def export_marketplace_file(platform, fmt="csv", changed_only=False):
+    """Returns (rewound temp file holding the export, rows, started). Spills to disk past 16 MB.
+    The caller moves the watermark to `started` once the file is safely stored."""
+    started = datetime.datetime.now()
+    out = tempfile.SpooledTemporaryFile(max_size=16 * 1024 * 1024)
+    rows = write_marketplace_file(platform, out, fmt, since=export_since(platform, changed_only))
+    out.seek(0)
+    return out, rows, started
+
+def generate_marketplace_file(platform, changed_only=False):
+    """In-memory variant for small catalogs. Returns (df or None when there is nothing to export, started); the caller moves the watermark."""
+    started = datetime.datetime.now()
+    chunks = list(iter_marketplace_chunks(platform, since=export_since(platform, changed_only)))
+    return (pd.concat(chunks, ignore_index=True) if chunks else None), started
 
 # ==========================================
 # 2. SMART WORKFLOWS (BILLING & STOCK)
 # ==========================================
 def process_smart_purchase(data):
     try:
-        db.supplier_ledger.insert_one({
+        post_ledger_entry({
             "supplier": data['supplier'], "date": pd.to_datetime(data['date']),
             "type": "Bill", "amount": data['grand_total'], "reference": data['bill_no'],
             "remarks": f"Smart Entry | Stock: {data['stock_type']}", "items": data['items'],
             "created_at": datetime.datetime.now()
         })
         if data['stock_type'] == 'Fabric' and data['stock_data']:
-            batch_id = datetime.datetime.now().strftime("%Y%m%d%H%M")
-            fabric_docs = []
-            for i, roll_wt in enumerate(data['stock_data'].get('rolls', [])):
-                fabric_docs.append({
-                    "fabric_name": data['stock_data']['name'], "color": data['stock_data']['color'],
-                    "batch_id": batch_id, "roll_no": f"{batch_id}-{i+1}", "quantity": float(roll_wt),
-                    "uom": "Kg", "supplier": data['supplier'], "bill_no": data['bill_no'],
-                    "status": "Available", "date_added": datetime.datetime.now()
-                })
-            if fabric_docs: db.fabric_rolls.insert_many(fabric_docs)
+            add_fabric_rolls_batch(data['stock_data']['name'], data['stock_data']['color'], data['stock_data'].get('rolls', []), "Kg", data['supplier'], data['bill_no'])
         elif data['stock_type'] == 'Accessory' and data['stock_data']:
-            db.accessories.update_one({"name": data['stock_data']['name']}, {"$inc": {"quantity": float(data['stock_data']['qty'])}}, upsert=True)
+            db.accessories.update_one({"name": data['stock_data']['name']}, {"$inc": {"quantity": float(data['stock_data']['qty'])}}, upsert=True); bump_version("accessories")
             db.accessory_logs.insert_one({"name": data['stock_data']['name'], "type": "Inward", "qty": float(data['stock_data']['qty']), "uom": data['stock_data']['uom'], "remarks": f"Bill {data['bill_no']}", "date": datetime.datetime.now()})
         if data['payment'] and data['payment']['amount'] > 0:
             pay_ref = generate_payment_id()
-            db.supplier_ledger.insert_one({"supplier": data['supplier'], "date": pd.to_datetime(data['date']), "type": "Payment", "amount": float(data['payment']['amount']), "reference": pay_ref, "remarks": f"Auto-Payment for Bill {data['bill_no']} ({data['payment']['mode']})", "created_at": datetime.datetime.now()})
+            post_ledger_entry({"supplier": data['supplier'], "date": pd.to_datetime(data['date']), "type": "Payment", "amount": float(data['payment']['amount']), "reference": pay_ref, "remarks": f"Auto-Payment for Bill {data['bill_no']} ({data['payment']['mode']})", "created_at": datetime.datetime.now()})
         return True, "Transaction Successful"
     except Exception as e: return False, str(e)
 
 # ==========================================
 # 3. HELPERS
 # ==========================================
-def generate_payment_id(prefix="PAY"):
-    today = datetime.datetime.now().strftime("%Y%m%d")
-    count = db.supplier_ledger.count_documents({"type": {"$in": ["Payment", "Debit Note"]}, "created_at": {"$gte": datetime.datetime.now().replace(hour=0,minute=0)}})
-    return f"{prefix}-{today}-{count+1:03d}"
+# --- SEQUENCES ---
+# Atomic counters in `counters` (one doc per name/prefix[/day]) replace count/sort-and-parse ID generation.
+# scope: "daily" restarts at 1 every day, "monotonic" never resets. `seed` = (collection, field) holding issued IDs.
+SEQUENCES = {
+    "payment": {"prefix": "PAY", "scope": "daily", "format": "{prefix}-{day}-{n:03d}", "seed": ("supplier_ledger", "reference")},
+    "lot": {"prefix": "LOT", "scope": "monotonic", "format": "{prefix}{n:03d}", "seed": ("lots", "lot_no")},
+    "roll_batch": {"prefix": "", "scope": "daily", "format": "{prefix}{day}-{n:03d}", "seed": ("fabric_rolls", "batch_id")},
+}
+
+def sequence_key(name, prefix, day):
+    return f"{name}:{prefix}:{day}" if SEQUENCES[name]['scope'] == "daily" else f"{name}:{prefix}"
+
+def seed_sequence(name, prefix=None, day=None):
+    """Raises the counter to the highest ID already issued in the data (never lowers it)."""
+    cfg = SEQUENCES[name]; prefix = cfg['prefix'] if prefix is None else prefix
+    day = day or datetime.datetime.now().strftime("%Y%m%d")
+    head = cfg['format'].split("{n")[0].format(prefix=prefix, day=day)
+    coll, field = cfg['seed']; pat = re.compile("^" + re.escape(head) + r"(\d+)$"); top = 0
+    for d in db[coll].find({field: {"$regex": "^" + re.escape(head)}}, {"_id": 0, field: 1}):
+        m = pat.match(str(d.get(field, "")))
+        if m: top = max(top, int(m.group(1)))
+    db.counters.update_one({"_id": sequence_key(name, prefix, day)}, {"$max": {"seq": top}}, upsert=True)
+
+def seed_sequences():
+    """Migration: seeds every sequence (today's key for daily ones) from existing data."""
+    for name in SEQUENCES: seed_sequence(name)
+
+def next_sequence(name, prefix=None, peek=False):
+    """Next formatted ID for a sequence; peek=True shows it without consuming it."""
+    cfg = SEQUENCES[name]; prefix = cfg['prefix'] if prefix is None else prefix
+    day = datetime.datetime.now().strftime("%Y%m%d"); key = sequence_key(name, prefix, day)
+    if peek: doc = db.counters.find_one({"_id": key}); n = doc['seq'] + 1 if doc else None
+    else: doc = db.counters.find_one_and_update({"_id": key}, {"$inc": {"seq": 1}}, return_document=pymongo.ReturnDocument.AFTER); n = doc['seq'] if doc else None
+    if n is None:  # first use of this key: seed from data, then retry
+        seed_sequence(name, prefix, day)
+        return next_sequence(name, prefix, peek)
+    return cfg['format'].format(prefix=prefix, day=day, n=n)
+
+def generate_payment_id(prefix="PAY"): return next_sequence("payment", prefix)
 
 def get_dashboard_stats():
-    today = datetime.datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
-    present = db.attendance.count_documents({"date": today, "in_time": {"$ne": None}})
-    return {"active_lots": db.lots.count_documents({"status": "Active"}), "rolls": db.fabric_rolls.count_documents({"status": "Available"}), "staff_present": present}
+    """Home metrics from the write-maintained stats/"live" doc (one lookup)."""
+    day = today_key()
+    doc = db.stats.find_one({"_id": LIVE_STATS, "v": LIVE_STATS_VERSION}, {"active_lots": 1, "rolls_available": 1, f"staff_present.{day}": 1})
+    if doc is None: rebuild_stage_totals(); doc = db.stats.find_one({"_id": LIVE_STATS}) or {}
+    return {"active_lots": doc.get('active_lots', 0), "rolls": doc.get('rolls_available', 0), "staff_present": doc.get('staff_present', {}).get(day, 0)}
+
+# --- SUPPLIER LEDGER ---
+LEDGER_DEBIT_TYPES = ["Payment", "Debit Note"]
+LEDGER_PAGE_SIZE = 50
+LEDGER_COLUMNS = ["ID", "Date", "Type", "Ref", "Credit", "Debit", "Balance", "Remarks", "Particulars"]
+
+def ledger_amounts(entry):
+    cr = entry['amount'] if entry['type'] == 'Bill' else 0; dr = entry['amount'] if entry['type'] in LEDGER_DEBIT_TYPES else 0
+    return cr, dr
+
+def post_ledger_entry(entry):
+    """Single write path for supplier_ledger: inserts the entry and keeps supplier_summary in step."""
+    db.supplier_ledger.insert_one(entry)
+    cr, dr = ledger_amounts(entry)
+    res = db.supplier_summary.update_one({"_id": entry['supplier']}, {"$inc": {"purchase": cr, "paid": dr, "entries": 1}})
+    if res.matched_count == 0: rebuild_supplier_summary(entry['supplier'])  # first entry or never summarised: seed from history
+
+def rebuild_supplier_summary(name=None):
+    """Recomputes supplier_summary from the ledger (one supplier, or all when name is None)."""
+    pipe = [{"$match": {"supplier": name}}] if name else []
+    pipe += [
+        {"$group": {"_id": "$supplier",
+                    "purchase": {"$sum": {"$cond": [{"$eq": ["$type", "Bill"]}, "$amount", 0]}},
+                    "paid": {"$sum": {"$cond": [{"$in": ["$type", LEDGER_DEBIT_TYPES]}, "$amount", 0]}},
+                    "entries": {"$sum": 1}}},
+        {"$merge": {"into": "supplier_summary", "whenMatched": "replace", "whenNotMatched": "insert"}},
+    ]
+    db.supplier_ledger.aggregate(pipe)
+
+def get_supplier_summary(name):
+    """Totals for the ledger header: {purchase, paid, balance, entries}. One document read."""
+    doc = db.supplier_summary.find_one({"_id": name})
+    if doc is None:
+        rebuild_supplier_summary(name); doc = db.supplier_summary.find_one({"_id": name}) or {}
+    purchase, paid = doc.get('purchase', 0), doc.get('paid', 0)
+    return {"purchase": purchase, "paid": paid, "balance": purchase - paid, "entries": doc.get('entries', 0)}
+
+def ledger_pipeline(name, skip=0, limit=None):
+    """Running balance via $setWindowFields over (date, _id); optionally sliced to one page."""
+    pipe = [
+        {"$match": {"supplier": name}},
+        {"$set": {"Credit": {"$cond": [{"$eq": ["$type", "Bill"]}, "$amount", 0]}, "Debit": {"$cond": [{"$in": ["$type", LEDGER_DEBIT_TYPES]}, "$amount", 0]}}},
+        {"$setWindowFields": {"sortBy": {"date": 1, "_id": 1}, "output": {"Balance": {"$sum": {"$subtract": ["$Credit", "$Debit"]}, "window": {"documents": ["unbounded", "current"]}}}}},
+    ]
+    if skip: pipe.append({"$skip": skip})
+    if limit: pipe.append({"$limit": limit})
+    ref = {"$ifNull": ["$reference", "-"]}; remarks = {"$ifNull": ["$remarks", ""]}
+    pipe.append({"$project": {"_id": 0, "ID": {"$toString": "$_id"}, "Date": "$date", "Type": "$type", "Ref": ref, "Credit": 1, "Debit": 1, "Balance": 1,
+                              "Remarks": remarks, "Particulars": {"$concat": [{"$toString": remarks}, " (", {"$toString": ref}, ")"]}}})
+    return pipe
 
 def get_supplier_ledger(name):
-    data = list(db.supplier_ledger.find({"supplier": name}).sort("date", 1)); res = []; bal = 0
-    if not data: return pd.DataFrame()
-    for row in data:
-        cr = row['amount'] if row['type'] == 'Bill' else 0; dr = row['amount'] if row['type'] in ['Payment', 'Debit Note'] else 0; bal += (cr - dr)
-        res.append({"ID": str(row['_id']), "Date": row['date'].strftime("%d-%b-%y"), "Type": row['type'], "Ref": row.get('reference', '-'), "Credit": cr, "Debit": dr, "Balance": bal, "Remarks": row.get('remarks', '')})
-    return pd.DataFrame(res)
+    data = list(db.supplier_ledger.aggregate(ledger_pipeline(name)))
+    return pd.DataFrame(data, columns=LEDGER_COLUMNS) if data else pd.DataFrame()
+
+def get_supplier_ledger_page(name, page, page_size=LEDGER_PAGE_SIZE):
+    """
+    One page (0-based) of the ledger with balances computed in MongoDB.
+    Returns: (page_df, opening_balance)
+    """
+    data = list(db.supplier_ledger.aggregate(ledger_pipeline(name, page * page_size, page_size)))
+    if not data: return pd.DataFrame(columns=LEDGER_COLUMNS), 0
+    first = data[0]
+    return pd.DataFrame(data, columns=LEDGER_COLUMNS), first['Balance'] - (first['Credit'] - first['Debit'])
 
 def add_simple_payment(sup, date, amt, mode, note):
     ref = generate_payment_id()
-    db.supplier_ledger.insert_one({"supplier": sup, "date": pd.to_datetime(date), "type": "Payment", "amount": amt, "reference": ref, "remarks": f"{mode} - {note}", "created_at": datetime.datetime.now()})
+    post_ledger_entry({"supplier": sup, "date": pd.to_datetime(date), "type": "Payment", "amount": amt, "reference": ref, "remarks": f"{mode} - {note}", "created_at": datetime.datetime.now()})
 
 # ==========================================
 # 4. INVENTORY & PRODUCTION
 # ==========================================
-def get_all_fabric_stock_summary(): return list(db.fabric_rolls.aggregate([{"$match": {"status": "Available"}}, {"$group": {"_id": {"name": "$fabric_name", "color": "$color"}, "total_qty": {"$sum": "$quantity"}}}]))
+# --- FABRIC INVENTORY INDEX ---
+# fabric_inventory holds one doc per (fabric_name, color) with available kg and roll count.
+# Roll inserts and lot launches keep it current with $inc; stats/"fabric_inventory" marks it as built.
+def rebuild_fabric_inventory():
+    """Recomputes the index from fabric_rolls (migration / repair)."""
+    agg = db.fabric_rolls.aggregate([{"$match": {"status": "Available"}}, {"$group": {"_id": {"fabric_name": "$fabric_name", "color": "$color"}, "kg": {"$sum": "$quantity"}, "rolls": {"$sum": 1}}}])
+    docs = [{**a['_id'], "kg": a['kg'], "rolls": a['rolls']} for a in agg]
+    db.fabric_inventory.delete_many({})
+    if docs: db.fabric_inventory.insert_many(docs)
+    db.stats.update_one({"_id": "fabric_inventory"}, {"$set": {"built_at": datetime.datetime.now()}}, upsert=True)
+
+def adjust_fabric_inventory(deltas):
+    """deltas: {(fabric_name, color): (kg, rolls)} applied in one bulk_write."""
+    if not db.stats.find_one({"_id": "fabric_inventory"}): rebuild_fabric_inventory(); return  # rebuild already reflects the change
+    ops = [UpdateOne({"fabric_name": f, "color": c}, {"$inc": {"kg": kg, "rolls": n}}, upsert=True) for (f, c), (kg, n) in deltas.items()]
+    if ops: db.fabric_inventory.bulk_write(ops, ordered=False)
+
+def get_fabric_inventory(fabrics=None):
+    """[{fabric_name, color, kg, rolls}] with stock on hand; optionally limited to some fabrics. One read."""
+    if not db.stats.find_one({"_id": "fabric_inventory"}): rebuild_fabric_inventory()
+    q = {"rolls": {"$gt": 0}}
+    if fabrics is not None: q["fabric_name"] = {"$in": list(fabrics)}
+    return [{**d, "kg": round(d['kg'], 3)} for d in db.fabric_inventory.find(q, {"_id": 0}).sort([("fabric_name", 1), ("color", 1)])]
+
+def get_all_fabric_stock_summary(): return [{"_id": {"name": d['fabric_name'], "color": d['color']}, "total_qty": d['kg']} for d in get_fabric_inventory()]
 def add_fabric_rolls_batch(fabric_name, color, rolls_data, uom, supplier, bill_no):
-    batch_id = datetime.datetime.now().strftime("%Y%m%d%H%M"); docs = [{"fabric_name": fabric_name, "color": color, "batch_id": batch_id, "roll_no": f"{batch_id}-{i+1}", "quantity": float(q), "uom": uom, "supplier": supplier, "bill_no": bill_no, "status": "Available", "date_added": datetime.datetime.now()} for i, q in enumerate(rolls_data)]
-    if docs: db.fabric_rolls.insert_many(docs)
-def update_accessory_stock(name, txn_type, qty, uom): db.accessories.update_one({"name": name}, {"$inc": {"quantity": float(qty) if txn_type == "Inward" else -float(qty)}, "$set": {"uom": uom}}, upsert=True)
+    if not rolls_data: return
+    batch_id = next_sequence("roll_batch"); docs = [{"fabric_name": fabric_name, "color": color, "batch_id": batch_id, "roll_no": f"{batch_id}-{i+1}", "quantity": float(q), "uom": uom, "supplier": supplier, "bill_no": bill_no, "status": "Available", "date_added": datetime.datetime.now()} for i, q in enumerate(rolls_data)]
+    db.fabric_rolls.insert_many(docs)
+    adjust_fabric_inventory({(fabric_name, color): (sum(d['quantity'] for d in docs), len(docs))})
+    inc_live_stats({"rolls_available": len(docs)})
+def update_accessory_stock(name, txn_type, qty, uom): db.accessories.update_one({"name": name}, {"$inc": {"quantity": float(qty) if txn_type == "Inward" else -float(qty)}, "$set": {"uom": uom}}, upsert=True); bump_version("accessories")
 def get_accessory_stock(): return list(db.accessories.find({}, {"_id": 0, "name": 1, "quantity": 1, "uom": 1}))
-def get_next_lot_no():
-    last = db.lots.find_one(sort=[("date_created", -1)])
-    if not last: return "LOT001"
-    try: return f"LOT{int(re.search(r'\d+', last['lot_no']).group()) + 1:03d}"
-    except: return "LOT001"
+def get_next_lot_no(reserve=False): return next_sequence("lot", peek=not reserve)
 def create_lot(lot_no, item, code, color, size_brk, rolls, cm):
-    total = sum(size_brk.values()); db.lots.insert_one({"lot_no": lot_no, "item_name": item, "item_code": code, "color": color, "total_qty": total, "size_breakdown": size_brk, "current_stage_stock": {"Cutting": size_brk}, "status": "Active", "created_by": cm, "consumed_rolls": rolls, "date_created": datetime.datetime.now()})
-    if rolls: db.fabric_rolls.update_many({"_id": {"$in": rolls}}, {"$set": {"status": "Consumed"}})
-def move_lot(lot_no, from_s, to_s, karigar, qty, size):
-    db.transactions.insert_one({"lot_no": lot_no, "from_stage": from_s, "to_stage": to_s, "karigar": karigar, "qty": qty, "variant": size, "timestamp": datetime.datetime.now()})
-    db.lots.update_one({"lot_no": lot_no}, {"$inc": {f"current_stage_stock.{from_s}.{size}": -qty, f"current_stage_stock.{to_s}.{size}": qty}})
+    total = sum(size_brk.values()); db.lots.insert_one({"lot_no": lot_no, "item_name": item, "item_code": code, "color": color, "total_qty": total, "size_breakdown": size_brk, "current_stage_stock": {"Cutting": size_brk}, "stage_totals": {"Cutting": total}, "status": "Active", "created_by": cm, "consumed_rolls": rolls, "date_created": datetime.datetime.now()})
+    consumed = 0
+    if rolls:
+        avail = {"_id": {"$in": rolls}, "status": "Available"}; deltas = {}
+        for r in db.fabric_rolls.find(avail, {"fabric_name": 1, "color": 1, "quantity": 1}):
+            kg, n = deltas.get((r['fabric_name'], r['color']), (0, 0)); deltas[(r['fabric_name'], r['color'])] = (kg - r['quantity'], n - 1)
+        consumed = db.fabric_rolls.update_many(avail, {"$set": {"status": "Consumed"}}).modified_count
+        adjust_fabric_inventory(deltas)
+    inc_live_stats({"active_lots": 1, "stage_totals.Cutting": total, "rolls_available": -consumed})
+def set_lot_status(lot_no, status):
+    """Changes a lot's status; leaving or re-entering Active moves its stage totals in or out of the live stats."""
+    before = db.lots.find_one_and_update({"lot_no": lot_no}, {"$set": {"status": status}}, projection={"status": 1, "stage_totals": 1})
+    if before is None: return False, "Lot not found"
+    was, active = before.get('status') == "Active", status == "Active"
+    if was != active:
+        sign = 1 if active else -1
+        inc_live_stats({"active_lots": sign, **{f"stage_totals.{f}": sign * q for f, q in before.get('stage_totals', {}).items()}})
+    return True, f"{lot_no} marked {status}"
+def move_lot(lot_no, from_s, to_s, karigar, qty, size): return move_lots_bulk([(lot_no, size, qty)], from_s, to_s, karigar)
+
+# --- BULK LOT MOVEMENT ---
+class StockConflict(Exception):
+    """Stage stock changed between the availability check and the write."""
+
+def write_lot_moves(lot_ops, txn_docs, stats_inc, rollups, session=None):
+    res = db.lots.bulk_write([UpdateOne(f, u) for f, u in lot_ops], ordered=False, session=session)
+    if res.matched_count != len(lot_ops): raise StockConflict()
+    db.transactions.insert_many(txn_docs, ordered=False, session=session)
+    db.throughput_daily.bulk_write(rollups, ordered=False, session=session)
+    return inc_live_stats(stats_inc, session=session, rebuild=False)
+
+def apply_lot_moves(lot_ops, undo_ops, txn_docs, stats_inc, rollups):
+    """All-or-nothing: one transaction when the server supports it, guarded updates with compensation otherwise."""
+    try:
+        with db.client.start_session() as s: counted = s.with_transaction(lambda s: write_lot_moves(lot_ops, txn_docs, stats_inc, rollups, s))
+        if not counted: rebuild_stage_totals()
+        return True
+    except StockConflict: return False
+    except pymongo.errors.OperationFailure as e:
+        if e.code != 20: raise  # 20 = IllegalOperation: standalone server, no transactions
+    done = []
+    for (f, u), undo in zip(lot_ops, undo_ops):
+        if db.lots.update_one(f, u).matched_count == 0:
+            for uf, uu in done: db.lots.update_one(uf, uu)
+            return False
+        done.append(undo)
+    db.transactions.insert_many(txn_docs, ordered=False)
+    db.throughput_daily.bulk_write(rollups, ordered=False)
+    inc_live_stats(stats_inc)
+    return True
+
+def move_lots_bulk(moves, from_s, to_s, karigar):
+    """
+    Moves many (lot_no, size, qty) tuples from one stage to another at once:
+    one availability read, one bulk_write on lots, one on transactions.
+    Any over-move rejects the whole movement. Returns: (ok, message)
+    """
+    want = {}
+    for lot_no, size, qty in moves:
+        if int(qty) > 0: want[(lot_no, size)] = want.get((lot_no, size), 0) + int(qty)
+    if not want: return False, "Nothing to move"
+    lot_nos = list({k[0] for k in want})
+    lots = list(db.lots.find({"lot_no": {"$in": lot_nos}}, {"lot_no": 1, "item_name": 1, f"current_stage_stock.{from_s}": 1}))
+    stock = {l['lot_no']: l.get('current_stage_stock', {}).get(from_s, {}) for l in lots}
+    short = [f"{lot_no}/{size}: {qty} > {stock.get(lot_no, {}).get(size, 0)}" for (lot_no, size), qty in want.items() if qty > stock.get(lot_no, {}).get(size, 0)]
+    if short: return False, "Not enough stock in " + from_s + ": " + "; ".join(short)
+
+    now = datetime.datetime.now(); lot_ops, undo_ops, txn_docs, stats_inc = [], [], [], {}
+    fam_from, fam_to = f"stage_totals.{stage_family(from_s)}", f"stage_totals.{stage_family(to_s)}"
+    for lot_no in lot_nos:
+        items = [(size, qty) for (l, size), qty in want.items() if l == lot_no]
+        guard = {f"current_stage_stock.{from_s}.{size}": {"$gte": qty} for size, qty in items}
+        inc = {}
+        for size, qty in items:
+            for k, v in ((f"current_stage_stock.{from_s}.{size}", -qty), (f"current_stage_stock.{to_s}.{size}", qty), (fam_from, -qty), (fam_to, qty)):
+                inc[k] = inc.get(k, 0) + v
+        for k in (fam_from, fam_to): stats_inc[k] = stats_inc.get(k, 0) + inc[k]
+        lot_ops.append(({"lot_no": lot_no, **guard}, {"$inc": inc}))
+        undo_ops.append(({"lot_no": lot_no}, {"$inc": {k: -v for k, v in inc.items()}}))
+        txn_docs += [{"lot_no": lot_no, "from_stage": from_s, "to_stage": to_s, "karigar": karigar, "qty": qty, "variant": size, "timestamp": now} for size, qty in items]
+    item_of = {l['lot_no']: l.get('item_name') for l in lots}
+    if not apply_lot_moves(lot_ops, undo_ops, txn_docs, stats_inc, throughput_ops(txn_docs, item_of)): return False, "Stock changed while moving; nothing was moved. Please retry."
+    return True, f"Moved {sum(want.values())} pcs across {len(lot_nos)} lot(s)"
+# --- THROUGHPUT ROLLUPS ---
+# throughput_daily: one doc per (date, stage, karigar, item) with pieces moved into the stage that day.
+# move_lots_bulk $incs it with the movement; backfill_throughput() rebuilds it from transactions.
+def rollup_key(day, stage, karigar, item): return {"date": day, "stage": stage, "karigar": karigar or "-", "item": item or "Unknown"}
+
+def throughput_ops(txn_docs, item_of):
+    agg = {}
+    for t in txn_docs:
+        k = (t['timestamp'].replace(hour=0, minute=0, second=0, microsecond=0), t['to_stage'], t['karigar'], item_of.get(t['lot_no']))
+        qty, n = agg.get(k, (0, 0)); agg[k] = (qty + t['qty'], n + 1)
+    return [UpdateOne(rollup_key(*k), {"$inc": {"qty": qty, "moves": n}, "$set": {"family": stage_family(k[1])}}, upsert=True) for k, (qty, n) in agg.items()]
+
+TXN_TO_STAGE = {"$ifNull": ["$to_stage", "$to"]}  # older transactions store from/to instead of from_stage/to_stage
+
+def backfill_throughput(since=None):
+    """Rebuilds throughput_daily from transactions (all history, or from `since` onwards) in one $merge.
+    Transactions without a date or a target stage are skipped ($merge rejects null keys)."""
+    day = since.replace(hour=0, minute=0, second=0, microsecond=0) if since else None
+    db.throughput_daily.delete_many({"date": {"$gte": day}} if since else {})
+    db.transactions.aggregate([
+        {"$match": {"timestamp": {"$gte": day} if since else {"$type": "date"}}},
+        {"$set": {"stage": TXN_TO_STAGE}},
+        {"$match": {"stage": {"$type": "string", "$ne": ""}}},
+        {"$group": {"_id": {"date": {"$dateTrunc": {"date": "$timestamp", "unit": "day"}}, "stage": "$stage", "karigar": {"$ifNull": ["$karigar", "-"]}, "lot": "$lot_no"}, "qty": {"$sum": "$qty"}, "moves": {"$sum": 1}}},
+        {"$lookup": {"from": "lots", "localField": "_id.lot", "foreignField": "lot_no", "pipeline": [{"$project": {"_id": 0, "item_name": 1}}], "as": "lot"}},
+        {"$group": {"_id": {"date": "$_id.date", "stage": "$_id.stage", "karigar": "$_id.karigar", "item": {"$ifNull": [{"$first": "$lot.item_name"}, "Unknown"]}}, "qty": {"$sum": "$qty"}, "moves": {"$sum": "$moves"}}},
+        {"$project": {"_id": 0, "date": "$_id.date", "stage": "$_id.stage", "karigar": "$_id.karigar", "item": "$_id.item", "family": {"$first": {"$split": ["$_id.stage", " - "]}}, "qty": 1, "moves": 1}},
+        {"$merge": {"into": "throughput_daily", "on": ["date", "stage", "karigar", "item"], "whenMatched": "replace", "whenNotMatched": "insert"}},
+    ])
+    return db.throughput_daily.count_documents({})
+
+def get_throughput(start, end, by=("date", "family")):
+    """Pieces moved per `by` fields (date / stage / family / karigar / item) between two dates, from the rollups."""
+    rows = db.throughput_daily.aggregate([{"$match": {"date": {"$gte": start, "$lt": end}}},
+                                          {"$group": {"_id": {k: f"${k}" for k in by}, "qty": {"$sum": "$qty"}, "moves": {"$sum": "$moves"}}},
+                                          {"$replaceRoot": {"newRoot": {"$mergeObjects": ["$_id", {"qty": "$qty", "moves": "$moves"}]}}}, {"$sort": {k: 1 for k in by}}])
+    return pd.DataFrame(list(rows), columns=[*by, "qty", "moves"])
+
+WIP_AGE_BUCKETS = [0, 8, 15, 31, 61]  # days: 0-7, 8-14, 15-30, 31-60, 61+
+
+def get_wip_ageing():
+    """Pieces still in each stage family of active lots, by lot age bucket."""
+    rows = db.lots.aggregate([
+        {"$match": {"status": "Active"}},
+        {"$project": {"age": {"$dateDiff": {"startDate": "$date_created", "endDate": "$$NOW", "unit": "day"}}, "t": {"$objectToArray": {"$ifNull": ["$stage_totals", {}]}}}},
+        {"$unwind": "$t"}, {"$match": {"t.v": {"$gt": 0}}},
+        {"$bucket": {"groupBy": "$age", "boundaries": WIP_AGE_BUCKETS + [10**6], "default": "?", "output": {"items": {"$push": "$t"}}}},
+        {"$unwind": "$items"}, {"$group": {"_id": {"b": "$_id", "stage": "$items.k"}, "qty": {"$sum": "$items.v"}, "lots": {"$sum": 1}}},
+        {"$sort": {"_id.b": 1, "_id.stage": 1}},
+    ])
+    label = {lo: (f"{lo}-{hi - 1} d" if hi < 10**6 else f"{lo}+ d") for lo, hi in zip(WIP_AGE_BUCKETS, WIP_AGE_BUCKETS[1:] + [10**6])}
+    return pd.DataFrame([{"Age": label.get(r['_id']['b'], "?"), "Stage": r['_id']['stage'], "Qty": r['qty'], "Lots": r['lots']} for r in rows], columns=["Age", "Stage", "Qty", "Lots"])
+
+# --- STAGE TOTALS ---
+# Each lot carries stage_totals {family: qty}; stats/"live" holds active_lots and the same totals
+# across all active lots. create_lot and move_lots_bulk maintain both with $inc.
+LIVE_STATS = "live"
+LIVE_STATS_VERSION = 2  # 2: + rolls_available, staff_present.{date}; older docs are rebuilt on first write
+
+def stage_family(stage): return stage.split(' - ')[0]  # "Stitching - Ram" -> "Stitching"
+
+def stage_family_totals_expr(field="$current_stage_stock"):
+    """Aggregation expression: {stage: {size: qty}} -> {stage family: total qty}."""
+    pairs = {"$map": {"input": {"$objectToArray": {"$ifNull": [field, {}]}}, "as": "e", "in": {
+        "k": {"$first": {"$split": ["$$e.k", " - "]}},
+        "v": {"$sum": {"$map": {"input": {"$objectToArray": "$$e.v"}, "as": "s", "in": "$$s.v"}}}}}}
+    return {"$let": {"vars": {"pairs": pairs}, "in": {"$arrayToObject": {"$map": {"input": {"$setUnion": ["$$pairs.k"]}, "as": "f", "in": {
+        "k": "$$f", "v": {"$sum": {"$map": {"input": {"$filter": {"input": "$$pairs", "as": "p", "cond": {"$eq": ["$$p.k", "$$f"]}}}, "as": "p", "in": "$$p.v"}}}}}}}}}
+
+def inc_live_stats(inc, session=None, rebuild=True):
+    """$inc on the live stats doc. If it is missing or from an older layout it is rebuilt from source (or False is returned)."""
+    if db.stats.update_one({"_id": LIVE_STATS, "v": LIVE_STATS_VERSION}, {"$inc": inc}, session=session).matched_count: return True
+    if rebuild: rebuild_stage_totals()
+    return False
+
+def today_key(): return datetime.date.today().isoformat()
+
+def exact_live_stats():
+    """What stats/"live" should hold, computed from lots, fabric_rolls and attendance."""
+    fams = db.lots.aggregate([{"$match": {"status": "Active"}}, {"$project": {"t": {"$objectToArray": stage_family_totals_expr()}}}, {"$unwind": "$t"}, {"$group": {"_id": "$t.k", "qty": {"$sum": "$t.v"}}}])
+    today = datetime.datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+    return {"active_lots": db.lots.count_documents({"status": "Active"}), "stage_totals": {f['_id']: f['qty'] for f in fams if f['qty']},
+            "rolls_available": db.fabric_rolls.count_documents({"status": "Available"}),
+            "staff_present": {today_key(): db.attendance.count_documents({"date": today, "in_time": {"$ne": None}})}}
+
+def rebuild_stage_totals():
+    """Recomputes every lot's stage_totals and the whole live stats doc (migration / repair)."""
+    db.lots.update_many({}, [{"$set": {"stage_totals": stage_family_totals_expr()}}])
+    db.stats.update_one({"_id": LIVE_STATS}, {"$set": {**exact_live_stats(), "v": LIVE_STATS_VERSION}}, upsert=True)
+
+def reconcile_live_stats(fix=True):
+    """Compares stats/"live" with exact values. Returns {field: (stored, exact)} for every drifted counter
+    ({} when fixing and a counter moved during the comparison: the fix waits for the next run)."""
+    doc = db.stats.find_one({"_id": LIVE_STATS}) or {}; exact = exact_live_stats(); day = today_key(); drift = {}
+    for k in ("active_lots", "rolls_available"):
+        if doc.get(k, 0) != exact[k]: drift[k] = (doc.get(k, 0), exact[k])
+    stored_t = {f: q for f, q in doc.get('stage_totals', {}).items() if q}
+    for f in set(stored_t) | set(exact['stage_totals']):
+        if stored_t.get(f, 0) != exact['stage_totals'].get(f, 0): drift[f"stage_totals.{f}"] = (stored_t.get(f, 0), exact['stage_totals'].get(f, 0))
+    present = doc.get('staff_present', {}).get(day, 0)
+    if present != exact['staff_present'][day]: drift[f"staff_present.{day}"] = (present, exact['staff_present'][day])
+    if drift and not fix: log.warning("live stats drift: %s", drift)
+    if fix:  # compare-and-set on the values read: a counter $inc'd meanwhile no longer matches and waits for the next run
+        upd = {"$set": {"v": LIVE_STATS_VERSION, "last_reconcile": {"at": datetime.datetime.now(), "drift": {k: list(v) for k, v in drift.items()}},
+                        **{k: exact_v for k, (stored, exact_v) in drift.items()}}}
+        old_days = {f"staff_present.{d}": "" for d in doc.get('staff_present', {}) if d != day}  # days before today
+        if old_days: upd["$unset"] = old_days
+        seen = {k: ({"$in": [0, None]} if stored == 0 else stored) for k, (stored, exact_v) in drift.items()}  # 0 = zero or absent
+        if not doc: db.stats.update_one({"_id": LIVE_STATS}, upd, upsert=True)
+        elif not db.stats.update_one({"_id": LIVE_STATS, **seen}, upd).matched_count:
+            log.info("live stats changed during reconcile; left for the next run"); return {}
+        if drift: log.warning("live stats drift fixed: %s", drift)
+    return drift
+
+def get_production_totals():
+    """Headline Track Lot metrics from one document read."""
+    doc = db.stats.find_one({"_id": LIVE_STATS, "v": LIVE_STATS_VERSION}, {"active_lots": 1, "stage_totals": 1})
+    if doc is None: rebuild_stage_totals(); doc = db.stats.find_one({"_id": LIVE_STATS}) or {}
+    t = doc.get('stage_totals', {})
+    return {"active_lots": doc.get('active_lots', 0), "Cutting": t.get('Cutting', 0), "Stitching": t.get('Stitching', 0), "Finishing": t.get('Finishing', 0)}
+
+def lot_summary_pipeline():
+    return [
+        {"$match": {"status": "Active"}},
+        {"$project": {"_id": 0, "Lot": "$lot_no", "Item": "$item_name", "Color": "$color", "Total": "$total_qty", "t": {"$ifNull": ["$stage_totals", stage_family_totals_expr()]}}},
+        {"$project": {"Lot": 1, "Item": 1, "Color": 1, "Total": 1, "Cut": {"$ifNull": ["$t.Cutting", 0]}, "Stitch": {"$ifNull": ["$t.Stitching", 0]}, "Finish": {"$ifNull": ["$t.Finishing", 0]}}},
+        {"$sort": {"Lot": 1}},
+    ]
+
+def get_lot_summary():
+    """Active-lot table for Track Lot in a single aggregation."""
+    return pd.DataFrame(list(db.lots.aggregate(lot_summary_pipeline())), columns=["Lot", "Item", "Color", "Total", "Cut", "Stitch", "Finish"])
+
 def get_lot_transactions(lot_no): return list(db.transactions.find({"lot_no": lot_no}).sort("timestamp", -1))
 
 # ==========================================
 # 5. HR, MASTERS & GST
 # ==========================================
-def add_piece_rate(item, process, rate): db.rates.update_one({"item": item, "process": process}, {"$set": {"rate": float(rate)}}, upsert=True)
+
+# --- MASTER-DATA CACHE ---
+# Fetcher results are cached in-process, stamped with a per-collection version counter
+# (`meta_versions`). Writers call bump_version(), so entries are dropped exactly when their data changes.
+VERSION_CHECK_SECONDS = 1.0  # headless callers re-read versions at most this often; the app refreshes once per rerun
+_versions = {"at": 0.0, "v": {}}
+_cache = {}
+CACHE_STATS = {}
+
+def refresh_versions():
+    """Re-reads every collection version in one query."""
+    _versions['v'] = {d['_id']: d.get('v', 0) for d in db.meta_versions.find({})}
+    _versions['at'] = time.monotonic()
+
+def collection_versions():
+    if time.monotonic() - _versions['at'] > VERSION_CHECK_SECONDS: refresh_versions()
+    return _versions['v']
+
+def bump_version(*collections):
+    for c in collections:
+        doc = db.meta_versions.find_one_and_update({"_id": c}, {"$inc": {"v": 1}}, upsert=True, return_document=pymongo.ReturnDocument.AFTER)
+        _versions['v'][c] = doc['v']
+
+def cached(*collections):
+    """Caches a fetcher per argument tuple until one of `collections` is bumped."""
+    def wrap(fn):
+        @functools.wraps(fn)
+        def inner(*args):
+            versions = collection_versions()
+            stamp = tuple(versions.get(c, 0) for c in collections)
+            stats = CACHE_STATS.setdefault(fn.__name__, {"hits": 0, "misses": 0})
+            hit = _cache.get((fn.__name__, args))
+            if hit and hit[0] == stamp:
+                stats['hits'] += 1
+                return copy.copy(hit[1])
+            stats['misses'] += 1
+            val = fn(*args); _cache[(fn.__name__, args)] = (stamp, val)
+            return copy.copy(val)
+        return inner
+    return wrap
+
+def cache_stats():
+    """Hit/miss counters per cached fetcher plus totals."""
+    hits = sum(s['hits'] for s in CACHE_STATS.values()); misses = sum(s['misses'] for s in CACHE_STATS.values())
+    return {"hits": hits, "misses": misses, "hit_rate": hits / (hits + misses) if hits + misses else 0.0, "by_fetcher": {k: dict(v) for k, v in CACHE_STATS.items()}}
+
+def add_piece_rate(item, process, rate): db.rates.update_one({"item": item, "process": process}, {"$set": {"rate": float(rate)}}, upsert=True); bump_version("rates")
+@cached("rates")
 def get_rate_master_df(): return pd.DataFrame(list(db.rates.find({}, {"_id": 0, "item": 1, "process": 1, "rate": 1})))
 def mark_attendance(staff_name, action):
     today = datetime.datetime.now().replace(hour=0, minute=0, second=0, microsecond=0); now_time = datetime.datetime.now().strftime("%H:%M")
-    if action == "In": db.attendance.update_one({"staff": staff_name, "date": today}, {"$set": {"in_time": now_time, "status": "Present"}}, upsert=True)
+    if action == "In":
+        before = db.attendance.find_one_and_update({"staff": staff_name, "date": today}, {"$set": {"in_time": now_time, "status": "Present"}}, projection={"in_time": 1}, upsert=True)
+        if not (before and before.get('in_time')): inc_live_stats({f"staff_present.{today_key()}": 1})  # first check-in of the day
     elif action == "Out": db.attendance.update_one({"staff": staff_name, "date": today}, {"$set": {"out_time": now_time}})
 def get_today_attendance(): return list(db.attendance.find({"date": datetime.datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)}))
-def get_staff_payout(month, year):
+PAYOUT_COLUMNS = ["Staff", "Item", "Process", "Qty", "Rate", "Total Pay"]
+
+def month_bounds(month, year):
     start = datetime.datetime(year, month, 1); end = datetime.datetime(year + 1, 1, 1) if month == 12 else datetime.datetime(year, month + 1, 1)
-    prod_data = list(db.transactions.aggregate([{"$match": {"timestamp": {"$gte": start, "$lt": end}}}, {"$group": {"_id": {"karigar": "$karigar", "lot": "$lot_no", "stage": "$to_stage"}, "total_qty": {"$sum": "$qty"}}}]))
-    report = []
-    for p in prod_data:
-        k = p['_id']['karigar']; lot = p['_id']['lot']; stage_raw = p['_id']['stage'].split(' - ')[0]; qty = p['total_qty']
-        l_info = db.lots.find_one({"lot_no": lot}); item = l_info['item_name'] if l_info else "Unknown"
-        r_doc = db.rates.find_one({"item": item, "process": stage_raw}); rate = r_doc['rate'] if r_doc else 0.0
-        report.append({"Staff": k, "Item": item, "Process": stage_raw, "Qty": qty, "Rate": rate, "Total Pay": qty * rate})
-    return pd.DataFrame(report)
+    return start, end
+
+def payout_pipeline(start, end):
+    """transactions -> (karigar, lot, stage) qty, joined to lots (item) and rates (piece rate) server-side."""
+    return [
+        {"$match": {"timestamp": {"$gte": start, "$lt": end}}},
+        {"$group": {"_id": {"karigar": "$karigar", "lot": "$lot_no", "stage": TXN_TO_STAGE}, "total_qty": {"$sum": "$qty"}}},
+        {"$lookup": {"from": "lots", "localField": "_id.lot", "foreignField": "lot_no", "pipeline": [{"$project": {"_id": 0, "item_name": 1}}], "as": "lot"}},
+        {"$set": {"item": {"$ifNull": [{"$first": "$lot.item_name"}, "Unknown"]}, "process": {"$first": {"$split": ["$_id.stage", " - "]}}}},
+        {"$lookup": {"from": "rates", "localField": "item", "foreignField": "item", "let": {"process": "$process"},
+                     "pipeline": [{"$match": {"$expr": {"$eq": ["$process", "$$process"]}}}, {"$project": {"_id": 0, "rate": 1}}], "as": "rate"}},
+        {"$set": {"rate": {"$ifNull": [{"$first": "$rate.rate"}, 0.0]}}},
+        {"$project": {"_id": 0, "Staff": "$_id.karigar", "Item": "$item", "Process": "$process", "Qty": "$total_qty", "Rate": "$rate", "Total Pay": {"$multiply": ["$total_qty", "$rate"]}}},
+        {"$sort": {"Staff": 1, "Item": 1, "Process": 1}},
+    ]
 
+def get_staff_payout(month, year, refresh=False):
+    """
+    Piece-rate payout for one month in a single aggregation.
+    Closed months are frozen into payout_snapshots on first computation and served from there.
+    """
+    start, end = month_bounds(month, year)
+    key = f"{year}-{month:02d}"
+    closed = end <= datetime.datetime.now().replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+    if closed and not refresh:
+        snap = db.payout_snapshots.find_one({"_id": key})
+        if snap: return pd.DataFrame(snap['rows'], columns=PAYOUT_COLUMNS)
+    rows = list(db.transactions.aggregate(payout_pipeline(start, end)))
+    if closed: db.payout_snapshots.replace_one({"_id": key}, {"month": month, "year": year, "rows": rows, "frozen_at": datetime.datetime.now()}, upsert=True)
+    return pd.DataFrame(rows, columns=PAYOUT_COLUMNS)
+
+def get_staff_payout_range(from_month, from_year, to_month, to_year):
+    """Month-by-month payout over an inclusive range, with a leading Month column."""
+    frames = []; y, m = from_year, from_month
+    while (y, m) <= (to_year, to_month):
+        df = get_staff_payout(m, y)
+        if not df.empty: frames.append(df.assign(Month=f"{y}-{m:02d}"))
+        y, m = (y + 1, 1) if m == 12 else (y, m + 1)
+    if not frames: return pd.DataFrame(columns=["Month"] + PAYOUT_COLUMNS)
+    return pd.concat(frames, ignore_index=True)[["Month"] + PAYOUT_COLUMNS]
+
+@cached("gst_slabs")
 def get_gst_slabs(): 
     slabs = list(db.gst_slabs.find({}, {"_id": 0, "rate": 1}).sort("rate", 1))
     return [s['rate'] for s in slabs] if slabs else [0, 2.5, 3, 5, 12, 18, 28]
-def add_gst_slab(rate): db.gst_slabs.update_one({"rate": float(rate)}, {"$set": {"rate": float(rate)}}, upsert=True)
+def add_gst_slab(rate): db.gst_slabs.update_one({"rate": float(rate)}, {"$set": {"rate": float(rate)}}, upsert=True); bump_version("gst_slabs")
+@cached("gst_slabs")
 def get_gst_df(): return pd.DataFrame(list(db.gst_slabs.find({}, {"_id": 0, "rate": 1}).sort("rate", 1)))
 
 # FETCHERS
+@cached("suppliers")
 def get_supplier_names(): return sorted(db.suppliers.distinct("name"))
+@cached("items")
 def get_item_names(): return sorted(db.items.distinct("item_name"))
+@cached("items")
 def get_codes_by_item_name(item_name): return sorted(db.items.distinct("item_code", {"item_name": item_name}))
+@cached("items")
 def get_colors_by_item_code(item_code): return sorted(db.items.distinct("color", {"item_code": item_code}))
+@cached("items")
 def get_item_details_by_code(code): return db.items.find_one({"item_code": code})
+@cached("materials")
 def get_materials(): return sorted(db.materials.distinct("name"))
+@cached("colors")
 def get_colors(): return sorted(db.colors.distinct("name"))
+@cached("staff")
 def get_staff(role): return [s['name'] for s in db.staff.find({"role": role})]
+@cached("staff")
 def get_all_staff_names(): return sorted(db.staff.distinct("name"))
+@cached("processes")
 def get_all_processes(): return sorted(db.processes.distinct("name"))
+@cached("sizes")
 def get_sizes(): return sorted(db.sizes.distinct("name"))
+@cached("accessories")
 def get_acc_names(): return sorted(db.accessories.distinct("name"))
 def get_active_lots(): return [l['lot_no'] for l in db.lots.find({"status": "Active"})]
 def get_all_lot_numbers(): return [l['lot_no'] for l in db.lots.find({}, {"lot_no": 1})]
 def get_lot_info(lot): return db.lots.find_one({"lot_no": lot})
+def get_lots_info(lots): return list(db.lots.find({"lot_no": {"$in": list(lots)}}).sort("lot_no", 1))
 def get_available_rolls(name, color): return list(db.fabric_rolls.find({"fabric_name": name, "color": color, "status": "Available"}))
+def get_available_rolls_for(pairs):
+    """{(fabric, color): [rolls]} for many fabric/colour pairs in one query."""
+    out = {p: [] for p in pairs}
+    if not out: return out
+    for r in db.fabric_rolls.find({"status": "Available", "$or": [{"fabric_name": f, "color": c} for f, c in out]}).sort("roll_no", 1): out[(r['fabric_name'], r['color'])].append(r)
+    return out
 
+@cached("suppliers")
 def get_suppliers_df(): return pd.DataFrame(list(db.suppliers.find({}, {"_id": 0, "name": 1, "gst": 1, "contact": 1})))
+@cached("items")
 def get_items_df(): return pd.DataFrame(list(db.items.find({}, {"_id": 0, "item_name": 1, "item_code": 1, "color": 1})))
+@cached("staff")
 def get_staff_df(): return pd.DataFrame(list(db.staff.find({}, {"_id": 0, "name": 1, "role": 1})))
+@cached("materials")
 def get_fabrics_df(): return pd.DataFrame(list(db.materials.find({}, {"_id": 0, "name": 1})))
+@cached("colors")
 def get_colors_df(): return pd.DataFrame(list(db.colors.find({}, {"_id": 0, "name": 1})))
+@cached("processes")
 def get_processes_df(): return pd.DataFrame(list(db.processes.find({}, {"_id": 0, "name": 1})))
+@cached("sizes")
 def get_sizes_df(): return pd.DataFrame(list(db.sizes.find({}, {"_id": 0, "name": 1})))
 
-def add_supplier(n, g, c, a): db.suppliers.insert_one({"name":n,"gst":g,"contact":c,"address":a})
-def add_item(n, c, col, fabs): db.items.insert_one({"item_name":n, "item_code":c, "color":col, "fabrics":fabs})
-def add_fabric(n): db.materials.insert_one({"name":n})
-def add_color(n): db.colors.insert_one({"name":n})
-def add_staff(n, r): db.staff.insert_one({"name":n,"role":r})
-def add_process(n): db.processes.insert_one({"name":n})
-def add_size(n): db.sizes.insert_one({"name":n})
+def add_supplier(n, g, c, a): db.suppliers.insert_one({"name":n,"gst":g,"contact":c,"address":a}); bump_version("suppliers")
+def add_item(n, c, col, fabs): db.items.insert_one({"item_name":n, "item_code":c, "color":col, "fabrics":fabs}); bump_version("items")
+def add_fabric(n): db.materials.insert_one({"name":n}); bump_version("materials")
+def add_color(n): db.colors.insert_one({"name":n}); bump_version("colors")
+def add_staff(n, r): db.staff.insert_one({"name":n,"role":r}); bump_version("staff")
+def add_process(n): db.processes.insert_one({"name":n}); bump_version("processes")
+def add_size(n): db.sizes.insert_one({"name":n}); bump_version("sizes")
+
+# ==========================================
+# 6. QUERY PLAN AUDIT
+# ==========================================
+# Representative shape of every filtered query in this module: (name, collection, explain command).
+# Full-collection reads (get_catalog_df, *_df fetchers) are scans by design and not listed.
+AUDIT_DATE = datetime.datetime(2025, 1, 1)
+QUERY_SHAPES = [
+    ("upload: sku prefetch", "catalog_groups", {"find": "catalog_groups", "filter": {"$or": [{"variants.sku": {"$in": ["X"]}}, {"_id": {"$in": ["G"]}}]}, "projection": GROUP_ATTRS_ONLY}),
+    ("catalog page", "catalog_groups", {"aggregate": "catalog_groups", "pipeline": catalog_page_groups(*catalog_page_plan()), "cursor": {}}),
+    ("catalog page: color filter", "catalog_groups", {"aggregate": "catalog_groups", "pipeline": catalog_page_groups(*catalog_page_plan({"color": ["X"]})), "cursor": {}}),
+    ("catalog price filter", "catalog_groups", {"find": "catalog_groups", "filter": {"variants": {"$elemMatch": {"selling_price": {"$gte": 100, "$lte": 500}}}}}),
+    ("catalog search", "catalog_groups", {"find": "catalog_groups", "filter": {"$text": {"$search": "X"}}}),
+    ("export: changed since", "catalog_groups", {"find": "catalog_groups", "filter": {"variants.last_updated": {"$gt": AUDIT_DATE}}}),
+    ("image link cache", "image_link_cache", {"find": "image_link_cache", "filter": {"_id": {"$in": ["X"]}, "expires_at": {"$gt": AUDIT_DATE}}}),
+    ("drc: used sort_index", "catalog_groups", {"distinct": "catalog_groups", "key": "sort_index", "query": {"sort_index": {"$in": [101]}}}),
+    ("sequence seed: payment refs", "supplier_ledger", {"find": "supplier_ledger", "filter": {"reference": {"$regex": "^PAY-20250101-"}}, "projection": {"_id": 0, "reference": 1}}),
+    ("sequence seed: roll batches", "fabric_rolls", {"find": "fabric_rolls", "filter": {"batch_id": {"$regex": "^20250101-"}}, "projection": {"_id": 0, "batch_id": 1}}),
+    ("sequence seed: lot numbers", "lots", {"find": "lots", "filter": {"lot_no": {"$regex": "^LOT"}}, "projection": {"_id": 0, "lot_no": 1}}),
+    ("supplier ledger page", "supplier_ledger", {"aggregate": "supplier_ledger", "pipeline": ledger_pipeline("X", 50, 50), "cursor": {}}),
+    ("supplier summary", "supplier_summary", {"find": "supplier_summary", "filter": {"_id": "X"}, "limit": 1}),
+    ("dashboard: live stats", "stats", {"find": "stats", "filter": {"_id": "live", "v": 2}, "limit": 1}),
+    ("reconcile: active lots", "lots", {"count": "lots", "query": {"status": "Active"}}),
+    ("reconcile: available rolls", "fabric_rolls", {"count": "fabric_rolls", "query": {"status": "Available"}}),
+    ("reconcile: staff present", "attendance", {"count": "attendance", "query": {"date": AUDIT_DATE, "in_time": {"$ne": None}}}),
+    ("fabric inventory", "fabric_inventory", {"find": "fabric_inventory", "filter": {"rolls": {"$gt": 0}, "fabric_name": {"$in": ["X"]}}, "sort": {"fabric_name": 1, "color": 1}}),
+    ("rolls for fabric/colours", "fabric_rolls", {"find": "fabric_rolls", "filter": {"status": "Available", "$or": [{"fabric_name": "X", "color": "Y"}]}}),
+    ("lot launch: consumed rolls", "fabric_rolls", {"find": "fabric_rolls", "filter": {"_id": {"$in": [ObjectId()]}, "status": "Available"}}),
+    ("available rolls", "fabric_rolls", {"find": "fabric_rolls", "filter": {"fabric_name": "X", "color": "Y", "status": "Available"}}),
+    ("lot info", "lots", {"find": "lots", "filter": {"lot_no": "X"}, "limit": 1}),
+    ("active lots", "lots", {"find": "lots", "filter": {"status": "Active"}}),
+    ("track lot summary", "lots", {"aggregate": "lots", "pipeline": lot_summary_pipeline(), "cursor": {}}),
+    ("move lots: stock read", "lots", {"find": "lots", "filter": {"lot_no": {"$in": ["X", "Y"]}}, "projection": {"lot_no": 1, "current_stage_stock.Cutting": 1}}),
+    ("move lots: guarded update", "lots", {"update": "lots", "updates": [{"q": {"lot_no": "X", "current_stage_stock.Cutting.M": {"$gte": 1}}, "u": {"$inc": {"current_stage_stock.Cutting.M": -1}}}]}),
+    ("throughput range", "throughput_daily", {"aggregate": "throughput_daily", "pipeline": [{"$match": {"date": {"$gte": AUDIT_DATE}}}, {"$group": {"_id": "$family", "qty": {"$sum": "$qty"}}}], "cursor": {}}),
+    ("lot transactions", "transactions", {"find": "transactions", "filter": {"lot_no": "X"}, "sort": {"timestamp": -1}}),
+    ("payout pipeline", "transactions", {"aggregate": "transactions", "pipeline": payout_pipeline(AUDIT_DATE, AUDIT_DATE), "cursor": {}}),
+    ("payout snapshot", "payout_snapshots", {"find": "payout_snapshots", "filter": {"_id": "2025-01"}, "limit": 1}),
+    ("attendance mark", "attendance", {"update": "attendance", "updates": [{"q": {"staff": "X", "date": AUDIT_DATE}, "u": {"$set": {"out_time": "00:00"}}}]}),
+    ("attendance today", "attendance", {"find": "attendance", "filter": {"date": AUDIT_DATE}}),
+    ("codes by item", "items", {"distinct": "items", "key": "item_code", "query": {"item_name": "X"}}),
+    ("colors by code", "items", {"distinct": "items", "key": "color", "query": {"item_code": "X"}}),
+    ("staff by role", "staff", {"find": "staff", "filter": {"role": "X"}}),
+]
+
+SORTED_BY_INDEX = {"catalog page", "catalog page: color filter"}  # shapes whose order must come off an index (no blocking SORT)
+
+def plan_stages(node):
+    """Yields every winning-plan stage name in an explain() output (rejected plans are skipped)."""
+    if isinstance(node, dict):
+        if isinstance(node.get('stage'), str): yield node['stage']
+        for k, v in node.items():
+            if k != 'rejectedPlans': yield from plan_stages(v)
+    elif isinstance(node, list):
+        for v in node: yield from plan_stages(v)
+
+def blocking_sort(explain):
+    """A SORT stage in the winning plan, or a $sort the pipeline could not push into the query layer."""
+    return "SORT" in plan_stages(explain) or any("$sort" in st for st in explain.get("stages", []) if isinstance(st, dict))
+
+def audit_query_plans():
+    """Runs explain() on every registered query shape. Returns a DataFrame; COLLSCAN rows are flagged,
+    and so are blocking sorts in SORTED_BY_INDEX shapes."""
+    report = []
+    for name, coll, cmd in QUERY_SHAPES:
+        try:
+            explain = db.command({"explain": cmd, "verbosity": "queryPlanner"}); stages = list(plan_stages(explain))
+            report.append({"Query": name, "Collection": coll, "Plan": " > ".join(dict.fromkeys(stages)), "COLLSCAN": "COLLSCAN" in stages,
+                           "Blocking SORT": name in SORTED_BY_INDEX and blocking_sort(explain)})
+        except pymongo.errors.PyMongoError as e:
+            report.append({"Query": name, "Collection": coll, "Plan": f"error: {e}", "COLLSCAN": False, "Blocking SORT": False})
+    return pd.DataFrame(report)
+
+IMPORT_TIME = round(time.perf_counter() - _T0, 4)  # seconds spent importing this module (no I/O happens here)
+
+if __name__ == "__main__":
+    cmd = sys.argv[1] if len(sys.argv) > 1 else "audit"
+    if cmd == "migrate-catalog":
+        done = db.stats.find_one({"_id": "catalog_groups"})
+        if done and "--force" not in sys.argv[2:]:  # groups deleted since would come back, with DRC numbers handed out again
+            print(f"Catalog already migrated (at {done.get('migrated_at', 'unknown time')}). Pass --force to insert groups still missing."); sys.exit(1)
+        print(f"catalog_groups inserted: {migrate_catalog_to_groups()}")
+    elif cmd == "backfill-throughput":
+        since = datetime.datetime.strptime(sys.argv[2], "%Y-%m-%d") if len(sys.argv) > 2 else None
+        print(f"throughput_daily rebuilt: {backfill_throughput(since)} buckets")
+    elif cmd == "reconcile-stats":
+        drift = reconcile_live_stats(); print("\n".join(f"{k}: stored {a}, actual {b}" for k, (a, b) in drift.items()) or "No drift.")
+    elif cmd == "rebuild-fabric-inventory":
+        rebuild_fabric_inventory(); print("Fabric inventory rebuilt.")
+    elif cmd == "rebuild-stage-totals":
+        rebuild_stage_totals(); print("Stage totals rebuilt.")
+    elif cmd == "seed-sequences":
+        seed_sequences(); print("Sequences seeded.")
+    elif cmd == "indexes":
+        problems = ensure_indexes(db)
+        print("\n".join(problems) if problems else "All indexes in place.")
+        sys.exit(1 if problems else 0)
+    elif cmd == "audit":
+        rep = audit_query_plans()
+        print(rep.to_string(index=False))
+        scans, sorts = rep[rep['COLLSCAN']], rep[rep['Blocking SORT']]
+        if not scans.empty: print(f"\n{len(scans)} query shape(s) fall back to COLLSCAN: " + ", ".join(scans['Query']))
+        if not sorts.empty: print(f"\n{len(sorts)} query shape(s) sort in memory: " + ", ".join(sorts['Query']))
+        sys.exit(1 if not (scans.empty and sorts.empty) else 0)
+    else:
+        print("usage: python db_manager.py [indexes|audit|migrate-catalog [--force]|seed-sequences|rebuild-stage-totals|rebuild-fabric-inventory|reconcile-stats|backfill-throughput [YYYY-MM-DD]]"); sys.exit(2)
@@ -0,0 +1,181 @@
+"""
+Background jobs for long operations (catalog upload, marketplace export, payout, image-link check).
+
+Work runs on a small per-process thread pool; state lives in the `jobs` collection so any rerun
+(or another session) can poll it. Result files are stored in GridFS (`job_artifacts`).
+Submitting with a `key` that matches a queued/running job returns that job instead of a new one
+(`active_key` carries the key only while the job is active; a unique index makes that race-free).
+Finished jobs expire after db.JOB_RETENTION_DAYS (TTL index) and a scheduled sweep deletes their files.
+Each process heartbeats the active jobs it owns; an active job whose heartbeat went stale belongs
+to a process that died and is failed by whichever process notices first.
+"""
+import datetime
+import functools
+import io
+import os
+import socket
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import gridfs
+import pymongo
+
+import db_manager as db
+import linkcheck
+
+JOB_WORKERS = int(os.environ.get("JOB_WORKERS", 2))
+PROGRESS_EVERY = 1.0  # seconds between progress writes
+ACTIVE = ["queued", "running"]
+OWNER = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"  # unique per process start, even if the pid is reused
+HEARTBEAT_EVERY = int(os.environ.get("JOB_HEARTBEAT_EVERY", 30))  # seconds
+STALE_AFTER = datetime.timedelta(seconds=HEARTBEAT_EVERY * 4)      # missed beats before a job counts as orphaned
+
+EXECUTOR = ThreadPoolExecutor(max_workers=JOB_WORKERS, thread_name_prefix="job")
+_heartbeat = threading.Lock()
+
+
+def artifacts(): return gridfs.GridFS(db.get_db(), collection="job_artifacts")
+
+def now(): return datetime.datetime.now()
+
+
+# --- RUNNERS ---
+# runner(job, payload, progress) -> (message, {artifact name: (filename, bytes or file object)}[, on_saved])
+# on_saved() runs only after every artifact is stored, just before the job is marked done.
+def run_upload(job, raw, progress):
+    """`raw` is the uploaded CSV's bytes; it is parsed chunk by chunk inside the job."""
+    total = max(raw.count(b"\n") - 1, 1); seen = [0]
+    def on_chunk(s): seen[0] += s['rows']; progress(seen[0], total, f"chunk {s['chunk']}: {s['success']} ok, {s['errors']} errors")
+    cnt, err_df = db.bulk_upload_catalog(db.read_catalog_csv(io.BytesIO(raw)), on_chunk=on_chunk, sync=job['params'].get('sync', False))
+    files = {"errors": ("upload_errors.csv", err_df.to_csv(index=False).encode('utf-8'))} if not err_df.empty else {}
+    return f"Successfully processed {cnt} rows, {len(err_df)} errors", files
+
+def run_export(job, _payload, progress):
+    plat, fmt, changed = job['params']['platform'], job['params']['format'], job['params'].get('changed_only', False)
+    progress(0, db.db.catalog_groups.estimated_document_count(), f"writing {plat}.{fmt}")
+    out, rows, started = db.export_marketplace_file(plat, fmt, changed)  # spills to disk for big catalogs
+    name = f"{plat}_{'Changes' if changed else 'List'}.{fmt}"
+    return f"{plat} {fmt} ready: {rows} rows", {"file": (name, out)}, lambda: db.set_export_watermark(plat, started)
+
+def run_payout(job, _payload, progress):
+    p = job['params']; df = db.get_staff_payout_range(p['from_month'], p['from_year'], p['to_month'], p['to_year'])
+    if df.empty: return "No production in this period.", {}
+    return f"{len(df)} rows", {"payout": ("payout.csv", df.to_csv(index=False).encode('utf-8'))}
+
+def run_linkcheck(job, raw, progress):
+    """Broken image links of an uploaded CSV (`raw` bytes), or of the live catalog when there is no payload."""
+    refresh = job['params'].get('refresh', False)
+    if raw: report = linkcheck.verify_upload_links(db.read_catalog_csv(io.BytesIO(raw)), refresh, progress)
+    else: report = linkcheck.verify_catalog_links(refresh, progress)
+    files = {"report": ("broken_links.csv", report.to_csv(index=False).encode('utf-8'))} if not report.empty else {}
+    return f"{len(report)} broken image links", files
+
+def run_reconcile(job, _payload, progress):
+    drift = db.reconcile_live_stats()
+    return ("drift: " + ", ".join(f"{k} {a}->{b}" for k, (a, b) in drift.items())) if drift else "no drift", {}
+
+def run_sweep(job, _payload, progress):
+    return f"{sweep_artifacts()} expired artifacts deleted", {}
+
+RUNNERS = {"upload": run_upload, "export": run_export, "payout": run_payout, "linkcheck": run_linkcheck, "reconcile": run_reconcile, "sweep": run_sweep}
+
+
+# --- QUEUE ---
+def fail_orphaned_jobs():
+    """Active jobs whose owner stopped heartbeating (process gone) can never finish: mark them failed."""
+    cutoff = now() - STALE_AFTER
+    db.db.jobs.update_many({"state": {"$in": ACTIVE}, "owner": {"$ne": OWNER}, "$or": [{"heartbeat_at": {"$lt": cutoff}}, {"heartbeat_at": {"$exists": False}, "created_at": {"$lt": cutoff}}]},
+                           {"$set": {"state": "failed", "error": "Worker stopped before the job finished", "finished_at": now()}, "$unset": {"active_key": ""}})
+
+def start_heartbeat():
+    """Once per process: a daemon thread that keeps this process's active jobs fresh and fails other processes' stale ones."""
+    if not _heartbeat.acquire(blocking=False): return
+    fail_orphaned_jobs()  # before the first submit looks for an active job with its key
+    def loop():
+        while True:
+            try:
+                db.db.jobs.update_many({"state": {"$in": ACTIVE}, "owner": OWNER}, {"$set": {"heartbeat_at": now()}})
+                fail_orphaned_jobs()
+            except Exception: db.log.exception("job heartbeat failed")
+            time.sleep(HEARTBEAT_EVERY)
+    threading.Thread(target=loop, name="job-heartbeat", daemon=True).start()
+
+def submit(kind, params=None, key=None, payload=None):
+    """Queues a job and returns its id (or the id of an active job with the same key)."""
+    start_heartbeat()
+    if key:
+        active = db.db.jobs.find_one({"active_key": key}, {"_id": 1})
+        if active: return active['_id']
+    job = {"_id": uuid.uuid4().hex, "kind": kind, "key": key, **({"active_key": key} if key else {}), "params": params or {}, "state": "queued", "owner": OWNER,
+           "progress": {"done": 0, "total": None}, "message": "", "artifacts": {}, "created_at": now(), "heartbeat_at": now()}
+    try: db.db.jobs.insert_one(job)
+    except pymongo.errors.DuplicateKeyError:  # another session queued the same key first
+        return db.db.jobs.find_one({"active_key": key}, {"_id": 1})['_id']
+    EXECUTOR.submit(execute, job, payload)
+    return job['_id']
+
+def execute(job, payload):
+    jid = job['_id']; last = [0.0]
+    db.db.jobs.update_one({"_id": jid}, {"$set": {"state": "running", "started_at": now()}})
+    def progress(done, total=None, message=""):
+        if time.monotonic() - last[0] < PROGRESS_EVERY and (total is None or done < total): return
+        last[0] = time.monotonic()
+        db.db.jobs.update_one({"_id": jid}, {"$set": {"progress": {"done": done, "total": total}, "message": message}})
+    try:
+        message, files, *on_saved = RUNNERS[job['kind']](job, payload, progress)
+        saved = {name: {"file_id": artifacts().put(data, filename=fname, job_id=jid), "filename": fname} for name, (fname, data) in files.items()}
+        for f in on_saved: f()  # e.g. the export watermark: only once the file can be downloaded
+        db.db.jobs.update_one({"_id": jid}, {"$set": {"state": "done", "message": message, "artifacts": saved, "finished_at": now()}, "$unset": {"active_key": ""}})
+    except Exception as e:
+        db.log.exception("job %s (%s) failed", jid, job['kind'])
+        db.db.jobs.update_one({"_id": jid}, {"$set": {"state": "failed", "error": f"{type(e).__name__}: {e}", "finished_at": now()}, "$unset": {"active_key": ""}})
+
+# --- SCHEDULE ---
+RECONCILE_EVERY = int(os.environ.get("RECONCILE_EVERY", 3600))  # seconds; 0 disables
+SWEEP_EVERY = int(os.environ.get("SWEEP_EVERY", 6 * 3600))        # seconds; 0 disables
+_scheduler = threading.Lock()
+
+def start_scheduler():
+    """Once per process: a daemon thread that queues the periodic jobs (dashboard-stats reconcile, artifact sweep)."""
+    every = {kind: secs for kind, secs in (("reconcile", RECONCILE_EVERY), ("sweep", SWEEP_EVERY)) if secs > 0}
+    if not every or not _scheduler.acquire(blocking=False): return
+    def loop():
+        due = dict.fromkeys(every, 0.0)
+        while True:
+            for kind in every:
+                if time.monotonic() < due[kind]: continue
+                try: submit(kind, key=kind)
+                except Exception: db.log.exception("could not queue %s job", kind)
+                due[kind] = time.monotonic() + every[kind]
+            time.sleep(max(min(due.values()) - time.monotonic(), 1))
+    threading.Thread(target=loop, name="job-scheduler", daemon=True).start()
+
+def get_job(job_id): return db.db.jobs.find_one({"_id": job_id}) if job_id else None
+
+@functools.lru_cache(maxsize=8)
+def read_artifact(file_id):
+    """GridFS files never change once stored, so reruns showing the same result reuse the bytes."""
+    return artifacts().get(file_id).read()
+
+def get_artifact(job, name):
+    """(filename, bytes) of a finished job's artifact, or None. For results rendered on the page."""
+    a = (job or {}).get("artifacts", {}).get(name)
+    return (a['filename'], read_artifact(a['file_id'])) if a else None
+
+def artifact_loader(job, name):
+    """(filename, callable returning the bytes), or None: for download buttons, so nothing is read until the click."""
+    a = (job or {}).get("artifacts", {}).get(name)
+    return (a['filename'], lambda: artifacts().get(a['file_id']).read()) if a else None
+
+def sweep_artifacts():
+    """Deletes the stored files of jobs the finished_at TTL index has removed. Returns how many went."""
+    files = db.db["job_artifacts.files"]; fs = artifacts()
+    owners = files.distinct("job_id")
+    alive = {j['_id'] for j in db.db.jobs.find({"_id": {"$in": owners}}, {"_id": 1})}
+    gone = [f['_id'] for f in files.find({"job_id": {"$in": [o for o in owners if o not in alive]}}, {"_id": 1})]  # not $nin: a job may store files meanwhile
+    for fid in gone: fs.delete(fid)
+    return len(gone)
+
+def recent_jobs(limit=20): return list(db.db.jobs.find({}, {"params": 0}).sort("created_at", -1).limit(limit))
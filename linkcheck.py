@@ -0,0 +1,99 @@
+"""
+Image-link verifier for the catalog and for upload files.
+
+Every distinct URL in the four image-link columns is checked on a bounded thread pool: HEAD
+first, then a one-byte ranged GET for servers that refuse HEAD. A link is good when it answers
+2xx with an image content type. Results are cached per URL in `image_link_cache`, where a TTL
+index drops them at `expires_at` (good links are trusted for days, failures re-checked soon),
+so re-uploading a file only checks links that are new or due.
+"""
+import datetime
+import os
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+from pymongo import ReplaceOne
+
+import db_manager as db
+
+IMAGE_COLS = ['image_link_1', 'image_link_2', 'image_link_3', 'image_link_4']
+LINK_WORKERS = int(os.environ.get("LINK_WORKERS", 16))
+LINK_TIMEOUT = float(os.environ.get("LINK_TIMEOUT", 10))  # seconds per request
+OK_TTL = datetime.timedelta(days=7)
+FAIL_TTL = datetime.timedelta(hours=1)
+CACHE_BATCH = 1000
+USER_AGENT = "ShineArc-LinkCheck/1.0"
+
+
+# --- SINGLE URL ---
+def request(url, method):
+    headers = {"User-Agent": USER_AGENT, **({"Range": "bytes=0-0"} if method == "GET" else {})}
+    with urllib.request.urlopen(urllib.request.Request(url, method=method, headers=headers), timeout=LINK_TIMEOUT) as r:
+        return r.status, r.headers.get("Content-Type", "")
+
+def check_url(url):
+    """-> {"ok", "status", "detail"} for one URL."""
+    if not url.lower().startswith(("http://", "https://")): return {"ok": False, "status": None, "detail": "not an http(s) link"}
+    try:
+        try: status, ctype = request(url, "HEAD")
+        except urllib.error.HTTPError as e:
+            if e.code not in (403, 405, 501): raise
+            status, ctype = request(url, "GET")  # some hosts/CDNs refuse HEAD
+    except urllib.error.HTTPError as e: return {"ok": False, "status": e.code, "detail": f"HTTP {e.code}"}
+    except (urllib.error.URLError, OSError, ValueError) as e: return {"ok": False, "status": None, "detail": str(getattr(e, 'reason', e))}
+    if not ctype.lower().startswith("image/"): return {"ok": False, "status": status, "detail": f"not an image ({ctype.split(';')[0] or 'no content type'})"}
+    return {"ok": True, "status": status, "detail": ""}
+
+
+# --- CACHED BATCH ---
+def verify_links(urls, refresh=False, workers=LINK_WORKERS, progress=None):
+    """Checks distinct URLs, reusing unexpired cached results unless refresh. Returns {url: result}."""
+    urls = list(dict.fromkeys(u.strip() for u in urls if isinstance(u, str) and u.strip() and u.strip().lower() != "nan"))
+    now = datetime.datetime.now(); results = {}
+    if not refresh:
+        for i in range(0, len(urls), CACHE_BATCH):  # the TTL monitor runs once a minute, so check expiry too
+            for d in db.db.image_link_cache.find({"_id": {"$in": urls[i:i + CACHE_BATCH]}, "expires_at": {"$gt": now}}):
+                results[d['_id']] = {"ok": d['ok'], "status": d['status'], "detail": d['detail']}
+    todo = [u for u in urls if u not in results]
+    if progress: progress(len(results), len(urls))
+    if todo:
+        ops = []
+        with ThreadPoolExecutor(max_workers=min(workers, len(todo)), thread_name_prefix="linkcheck") as pool:
+            for n, (url, res) in enumerate(zip(todo, pool.map(check_url, todo)), 1):
+                results[url] = res; at = datetime.datetime.now()
+                ops.append(ReplaceOne({"_id": url}, {**res, "checked_at": at, "expires_at": at + (OK_TTL if res['ok'] else FAIL_TTL)}, upsert=True))
+                if len(ops) >= CACHE_BATCH: db.db.image_link_cache.bulk_write(ops, ordered=False); ops = []
+                if progress: progress(len(urls) - len(todo) + n, len(urls))
+        if ops: db.db.image_link_cache.bulk_write(ops, ordered=False)
+    db.log.info("link check: %s urls, %s from cache, %s checked", len(urls), len(urls) - len(todo), len(todo))
+    return results
+
+
+# --- REPORTS ---
+def broken_link_report(df, key_cols, refresh=False, progress=None):
+    """One row per broken link in df's image columns, identified by key_cols."""
+    cols = [c for c in IMAGE_COLS if c in df.columns]
+    if df.empty or not cols: return pd.DataFrame(columns=key_cols + ["Column", "URL", "Status", "Detail"])
+    long = df.melt(id_vars=key_cols, value_vars=cols, var_name="Column", value_name="URL")
+    long['URL'] = long['URL'].astype(str).str.strip()
+    long = long[long['URL'].ne("") & long['URL'].str.lower().ne("nan")]
+    results = verify_links(long['URL'], refresh, progress=progress)
+    bad = long[~long['URL'].map(lambda u: results[u]['ok'])].copy()
+    bad['Status'] = bad['URL'].map(lambda u: results[u]['status']).astype("Int64"); bad['Detail'] = bad['URL'].map(lambda u: results[u]['detail'])
+    return bad.sort_values(key_cols + ["Column"]).reset_index(drop=True)
+
+def verify_catalog_links(refresh=False, progress=None):
+    """Broken-link report for the live catalog (SKU, Column, URL, Status, Detail)."""
+    fields = {"sku": 1, **{c: 1 for c in IMAGE_COLS}}
+    df = pd.DataFrame(list(db.catalog_groups().aggregate([*db.CATALOG_FLATTEN, {"$project": fields}])), columns=list(fields))
+    return broken_link_report(df.rename(columns={"sku": "SKU"}), ["SKU"], refresh, progress)
+
+def verify_upload_links(chunks, refresh=False, progress=None):
+    """Broken-link report for an upload file (raw chunks from read_catalog_csv); Row matches the upload error report."""
+    frames = []
+    for raw in chunks:
+        df = db.clean_catalog_frame(raw)
+        frames.append(pd.DataFrame({"Row": df.index + 2, "SKU": df['_sku'], **{c: df[c] for c in IMAGE_COLS if c in df.columns}}))
+    return broken_link_report(pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(), ["Row", "SKU"], refresh, progress)
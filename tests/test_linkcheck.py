@@ -0,0 +1,131 @@
+"""
+linkcheck against a local http.server: one handler path per outcome, plus the TTL result cache
+(image_link_cache on mongomock). Run with `python -m unittest discover tests` from the repo root.
+"""
+import datetime
+import os
+import socket
+import sys
+import threading
+import unittest
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import db_manager as db
+import linkcheck
+
+try: import mongomock
+except ImportError: mongomock = None
+
+
+class Handler(BaseHTTPRequestHandler):
+    hits = Counter()  # (method, path) -> requests served
+
+    def reply(self, code, ctype=None):
+        self.send_response(code)
+        if ctype: self.send_header("Content-Type", ctype)
+        self.send_header("Content-Length", "0"); self.end_headers()
+
+    def do_HEAD(self):
+        self.hits["HEAD", self.path] += 1
+        if self.path == "/img.png": self.reply(200, "image/png")
+        elif self.path == "/page.html": self.reply(200, "text/html; charset=utf-8")
+        elif self.path == "/nohead.jpg": self.reply(405)
+        else: self.reply(404)
+
+    def do_GET(self):
+        self.hits["GET", self.path] += 1
+        if self.path == "/nohead.jpg" and self.headers.get("Range") == "bytes=0-0": self.reply(206, "image/jpeg")
+        else: self.reply(404)
+
+    def log_message(self, *args): pass
+
+
+def configure_for(test, **settings):
+    """db.configure(**settings) for one test; cleanup puts db._overrides back and drops the client."""
+    saved = dict(db._overrides)
+    def restore(): db._overrides.clear(); db._overrides.update(saved); db.configure()
+    test.addCleanup(restore); db.configure(**settings)
+
+
+def free_port():
+    """A local port nothing listens on (bound, then released)."""
+    with socket.socket() as s: s.bind(("127.0.0.1", 0)); return s.getsockname()[1]
+
+
+class LinkServerTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+        cls.base = f"http://127.0.0.1:{cls.server.server_address[1]}"
+
+    @classmethod
+    def tearDownClass(cls): cls.server.shutdown(); cls.server.server_close()
+
+    def setUp(self): Handler.hits.clear()
+
+
+class CheckUrlTest(LinkServerTest):
+    def test_image(self):
+        self.assertEqual(linkcheck.check_url(f"{self.base}/img.png"), {"ok": True, "status": 200, "detail": ""})
+        self.assertEqual(Handler.hits["GET", "/img.png"], 0)  # HEAD was enough
+
+    def test_html_is_not_an_image(self):
+        res = linkcheck.check_url(f"{self.base}/page.html")
+        self.assertFalse(res['ok']); self.assertEqual(res['status'], 200); self.assertEqual(res['detail'], "not an image (text/html)")
+
+    def test_not_found(self):
+        self.assertEqual(linkcheck.check_url(f"{self.base}/gone.png"), {"ok": False, "status": 404, "detail": "HTTP 404"})
+
+    def test_head_refused_falls_back_to_ranged_get(self):
+        self.assertEqual(linkcheck.check_url(f"{self.base}/nohead.jpg"), {"ok": True, "status": 206, "detail": ""})
+        self.assertEqual(Handler.hits["HEAD", "/nohead.jpg"], 1); self.assertEqual(Handler.hits["GET", "/nohead.jpg"], 1)
+
+    def test_connection_refused(self):
+        res = linkcheck.check_url(f"http://127.0.0.1:{free_port()}/img.png")
+        self.assertFalse(res['ok']); self.assertIsNone(res['status']); self.assertTrue(res['detail'])
+
+    def test_non_http_link(self):
+        for url in ("ftp://example.com/a.png", "www.example.com/a.png", "/img.png"):
+            self.assertEqual(linkcheck.check_url(url), {"ok": False, "status": None, "detail": "not an http(s) link"})
+
+
+@unittest.skipUnless(mongomock, "mongomock not installed")
+class CacheTest(LinkServerTest):
+    def setUp(self):
+        super().setUp()
+        patcher = mock.patch.object(db.pymongo, "MongoClient", lambda uri, **kw: mongomock.MongoClient())
+        patcher.start(); self.addCleanup(patcher.stop)
+        configure_for(self, MONGO_URI="mongodb://test")
+        self.ok, self.bad = f"{self.base}/img.png", f"{self.base}/gone.png"
+
+    def served(self): return sum(Handler.hits.values())
+
+    def test_second_call_uses_cache(self):
+        first = linkcheck.verify_links([self.ok, self.bad, self.ok])
+        self.assertEqual(self.served(), 2)  # duplicates checked once
+        self.assertEqual(linkcheck.verify_links([self.ok, self.bad]), first)
+        self.assertEqual(self.served(), 2)
+
+    def test_refresh_bypasses_cache(self):
+        linkcheck.verify_links([self.ok])
+        linkcheck.verify_links([self.ok], refresh=True)
+        self.assertEqual(Handler.hits["HEAD", "/img.png"], 2)
+
+    def test_ttl_by_outcome(self):
+        linkcheck.verify_links([self.ok, self.bad])
+        cache = {d['_id']: d['expires_at'] - d['checked_at'] for d in db.db.image_link_cache.find()}
+        self.assertEqual(cache, {self.ok: linkcheck.OK_TTL, self.bad: linkcheck.FAIL_TTL})
+
+    def test_expired_entry_is_rechecked(self):
+        linkcheck.verify_links([self.ok])
+        db.db.image_link_cache.update_one({"_id": self.ok}, {"$set": {"expires_at": datetime.datetime.now() - datetime.timedelta(seconds=1)}})
+        linkcheck.verify_links([self.ok])
+        self.assertEqual(Handler.hits["HEAD", "/img.png"], 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,91 @@
+"""
+Shared Streamlit helpers for app.py and the page modules in views/.
+"""
+import functools
+import io
+from collections import deque
+
+import pandas as pd
+import streamlit as st
+
+import db_manager as db
+import jobs
+
+RENDER_PAGE_SIZE = 100  # rows per page; only the visible page is formatted and sent to the browser
+def reset_tables():
+    """Called by app.py every full rerun: same table in the same place keeps its widget keys."""
+    st.session_state._table_seq = {}
+
+def profile_history():
+    """This session's closed Query Debug buckets, newest last (other sessions' reruns never show up here)."""
+    return st.session_state.setdefault("_profile_history", deque(maxlen=20))
+
+def navigate_to(page): st.session_state.nav = page; st.rerun()
+
+def fragment(fn):
+    """st.fragment whose own reruns (a widget inside it changed) are profiled as '<page> › <name>' when Query Debug is on.
+    Tables rendered inside a fragment need an explicit render_df key."""
+    @functools.wraps(fn)
+    def body(*args, **kwargs):
+        own = st.session_state.get("dbg_on") and getattr(db.PROFILER.local, "bucket", None) is None  # not part of a full rerun
+        if own: db.begin_rerun(f"{st.session_state.get('nav', '')} › {fn.__name__}")
+        try: return fn(*args, **kwargs)
+        finally:
+            if own: profile_history().append(db.end_rerun())
+    return st.fragment(body)
+
+def format_page(page, image_cols):
+    """Formats one page column-at-a-time (no per-row Python beyond the page)."""
+    out = pd.DataFrame(index=page.index)
+    for col in page.columns:
+        s = page[col]
+        if col in image_cols:
+            url = s.astype(str)
+            out[col] = ('<img src="' + url + '" width="50" height="50" loading="lazy" onerror="this.style.display=\'none\'">').where(s.notna() & url.str.startswith('http'), '📷')
+        elif pd.api.types.is_datetime64_any_dtype(s): out[col] = s.dt.strftime('%d-%b-%y')
+        elif pd.api.types.is_float_dtype(s): out[col] = s.map('{:,.2f}'.format).where(s.notna(), "")
+        else: out[col] = s
+    return out
+
+def render_df(df, image_cols=[], page_size=RENDER_PAGE_SIZE, key=None):
+    if df.empty: st.info("No data available."); return
+    if key is None:
+        seq = st.session_state.setdefault("_table_seq", {})
+        sig = str(hash(tuple(map(str, df.columns)))); seq[sig] = seq.get(sig, 0) + 1; key = f"tbl_{sig}_{seq[sig]}"
+    n = len(df)
+    if n > page_size:
+        sortable = [c for c in df.columns if c not in image_cols]
+        c1, c2, c3 = st.columns([2, 1, 1])
+        sort_col = c1.selectbox("Sort by", ["(as listed)"] + sortable, key=f"{key}_sort")
+        desc = c2.toggle("Descending", key=f"{key}_desc")
+        pages = (n - 1) // page_size + 1
+        pg = c3.number_input(f"Page (of {pages})", 1, pages, 1, key=f"{key}_pg")
+        if sort_col != "(as listed)": df = df.sort_values(sort_col, ascending=not desc, kind="stable")
+        elif desc: df = df.iloc[::-1]
+        start = (pg - 1) * page_size; df = df.iloc[start:start + page_size]
+        st.caption(f"Rows {start + 1:,}–{start + len(df):,} of {n:,}")
+    html = format_page(df, image_cols).to_html(classes="custom-table", index=False, escape=False)
+    st.markdown(f'<div class="custom-table-container">{html}</div>', unsafe_allow_html=True)
+
+def job_panel(state_key, on_done):
+    """Shows the background job whose id is in st.session_state[state_key]; polls while it runs, then on_done(job)."""
+    job = jobs.get_job(st.session_state.get(state_key))
+    if not job: return
+    @st.fragment(run_every=2 if job['state'] in jobs.ACTIVE else None)
+    def panel():
+        j = jobs.get_job(job['_id'])
+        if j['state'] in jobs.ACTIVE:
+            p = j['progress']; frac = min(p['done'] / p['total'], 1.0) if p.get('total') else 0.0
+            st.progress(frac, text=f"{j['kind'].title()} {j['state']}… {j.get('message', '')}")
+        elif job['state'] in jobs.ACTIVE: st.rerun()  # finished since this page rendered
+        elif j['state'] == "failed": st.error(f"{j['kind'].title()} failed: {j.get('error')}")
+        else: on_done(j)
+    panel()
+
+def link_report(job):
+    """Result panel of a linkcheck job: the broken links, or a success note."""
+    rep = jobs.get_artifact(job, "report")
+    if not rep: st.success("All image links are reachable."); return
+    st.warning(job['message'])
+    st.dataframe(pd.read_csv(io.BytesIO(rep[1])), hide_index=True, use_container_width=True)
+    st.download_button("⬇️ Broken Links Report", rep[1], rep[0], "text/csv")
@@ -0,0 +1,11 @@
+"""
+App pages, one module per page, each exposing render(). A page module is imported the first
+time it is opened, so a rerun only loads (and runs) the page on screen.
+(Not `pages/`: Streamlit would turn that directory into its own multipage navigation.)
+"""
+import importlib
+
+PAGES = {"Home": "home", "Accounts": "accounts", "Production": "production", "Stock": "stock", "Catalog": "catalog",
+         "Track Lot": "track_lot", "Analytics": "analytics", "HR": "hr", "Configurations": "configurations"}
+
+def render(page): importlib.import_module(f"{__name__}.{PAGES[page]}").render()
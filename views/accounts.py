@@ -0,0 +1,85 @@
+import pandas as pd
+import streamlit as st
+
+import db_manager as db
+from ui import fragment, render_df
+
+
+@fragment
+def stock_entry(stype):
+    """Fabric rolls / accessory for the bill; kept in st.session_state.bill_stock for Save Bill."""
+    sdata = {}
+    if stype == "Fabric":
+        c_f, c_c = st.columns(2)
+        f = c_f.selectbox("Fabric", [""]+db.get_materials())
+        c = c_c.selectbox("Color", [""]+db.get_colors())
+        nr = st.number_input("Count", 1, 50, 1)
+        cols = st.columns(3); rolls_wt = []
+        for i in range(int(nr)):
+            v=cols[i%3].number_input(f"R{i+1}", 0.0, key=f"r{i}")
+            if v>0: rolls_wt.append(v)
+        sdata = {"name":f, "color":c, "rolls":rolls_wt}
+    elif stype == "Accessory":
+        n=st.selectbox("Acc Name", [""]+db.get_acc_names()); q=st.number_input("Qty",0.0); u=st.selectbox("Unit", ["Pcs","Kg"])
+        sdata = {"name":n, "qty":q, "uom":u}
+    st.session_state.bill_stock = sdata
+
+@fragment
+def bill_lines(sup, date, bill, stype):
+    """Line editor and Save Bill: adding a line reruns only this block."""
+    if 'bi' not in st.session_state: st.session_state.bi = []
+    i1, i2, i3 = st.columns([2,1,1])
+    inm = i1.text_input("Item"); iq = i2.number_input("Qty",1.0); ir = i3.number_input("Rate",0.0)
+    gst = st.selectbox("GST %", db.get_gst_slabs())
+    if st.button("Add Line"):
+        tax_val = (iq*ir) * (gst/100)
+        st.session_state.bi.append({"Item":inm, "Qty":iq, "Rate":ir, "GST":gst, "Tax":tax_val, "Amt":(iq*ir)+tax_val})
+    if st.session_state.bi:
+        render_df(pd.DataFrame(st.session_state.bi), key="bill_lines")
+        gt = sum(x['Amt'] for x in st.session_state.bi)
+        st.metric("Total Payable", f"₹ {gt:,.0f}")
+        if st.button("✅ Save Bill", type="primary"):
+            if sup and bill:
+                res, msg = db.process_smart_purchase({"supplier":sup, "date":str(date), "bill_no":bill, "grand_total":gt, "items":st.session_state.bi, "stock_type":stype, "stock_data":st.session_state.get("bill_stock", {}), "payment":None, "tax_slab":gst})
+                if res: st.success("Saved!"); st.session_state.bi=[]; st.rerun()
+            else: st.error("Missing Info")
+
+
+def render():
+    t1, t2 = st.tabs(["➕ New Entry", "📜 Ledger View"])
+    with t1:
+        with st.container(border=True):
+            st.info("Record Purchase or Payment")
+            c1, c2 = st.columns(2)
+            sup = c1.selectbox("Supplier", [""] + db.get_supplier_names())
+            date = c2.date_input("Date")
+            mode = st.radio("Type", ["Bill", "Payment"], horizontal=True)
+            if mode == "Bill":
+                bill = st.text_input("Bill No")
+                st.markdown("**Stock Entry**")
+                stype = st.selectbox("Type", ["No Stock", "Fabric", "Accessory"], label_visibility="collapsed")
+                stock_entry(stype)
+                st.markdown("**Bill Items**")
+                bill_lines(sup, date, bill, stype)
+            else:
+                amt = st.number_input("Amount", 0.0); pm = st.selectbox("Mode", ["Cash", "UPI", "Bank"]); note = st.text_input("Note")
+                if st.button("Save Payment", type="primary"):
+                    db.add_simple_payment(sup, date, amt, pm, note); st.success("Saved!"); st.rerun()
+    with t2:
+        sel = st.selectbox("Account", [""] + db.get_supplier_names())
+        if sel:
+            summ = db.get_supplier_summary(sel)
+            if summ['entries']:
+                cl_bal = summ['balance']
+                st.markdown("### 📊 Ledger Summary")
+                c1, c2, c3 = st.columns(3)
+                c1.metric("Total Purchase", f"₹ {summ['purchase']:,.2f}")
+                c2.metric("Total Paid", f"₹ {summ['paid']:,.2f}")
+                c3.metric("Net Balance", f"₹ {abs(cl_bal):,.2f} {'Cr' if cl_bal >= 0 else 'Dr'}")
+                st.divider()
+                pages = -(-summ['entries'] // db.LEDGER_PAGE_SIZE)
+                pg = st.number_input(f"Page (of {pages})", 1, pages, pages, key=f"ledger_pg_{sel}") if pages > 1 else 1
+                df, opening = db.get_supplier_ledger_page(sel, pg - 1)
+                st.caption(f"Opening Balance: ₹ {opening:,.2f}")
+                render_df(df[['Date', 'Particulars', 'Credit', 'Debit', 'Balance']])
+            else: st.warning("No Transaction History")
@@ -0,0 +1,33 @@
+import datetime
+
+import plotly.express as px
+import streamlit as st
+
+import db_manager as db
+from ui import render_df
+
+
+def render():
+    today = datetime.date.today()
+    c1, c2 = st.columns(2)
+    d_from = c1.date_input("From", today - datetime.timedelta(days=30)); d_to = c2.date_input("To", today)
+    start, end = datetime.datetime.combine(d_from, datetime.time()), datetime.datetime.combine(d_to + datetime.timedelta(days=1), datetime.time())
+    t1, t2, t3 = st.tabs(["📈 Throughput", "👷 Karigar Output", "⏳ WIP Ageing"])
+    with t1:
+        df = db.get_throughput(start, end, by=("date", "family"))
+        if df.empty: st.info("No movements in this period.")
+        else:
+            st.plotly_chart(px.bar(df, x="date", y="qty", color="family", labels={"qty": "Pieces", "date": "", "family": "Stage"}), use_container_width=True)
+            render_df(df.pivot_table(index="date", columns="family", values="qty", aggfunc="sum", fill_value=0).reset_index().assign(date=lambda x: x['date'].dt.strftime('%d-%b-%y')))
+    with t2:
+        df = db.get_throughput(start, end, by=("karigar", "family"))
+        if df.empty: st.info("No movements in this period.")
+        else:
+            st.plotly_chart(px.bar(df, y="karigar", x="qty", color="family", orientation="h", labels={"qty": "Pieces", "karigar": "", "family": "Stage"}), use_container_width=True)
+            render_df(df.rename(columns={"karigar": "Karigar", "family": "Stage", "qty": "Pieces", "moves": "Moves"}))
+    with t3:
+        df = db.get_wip_ageing()
+        if df.empty: st.info("No work in progress.")
+        else:
+            st.plotly_chart(px.bar(df, x="Age", y="Qty", color="Stage", hover_data=["Lots"], category_orders={"Age": list(dict.fromkeys(df['Age']))}), use_container_width=True)
+            render_df(df)
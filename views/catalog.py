@@ -0,0 +1,130 @@
+import hashlib
+import io
+
+import pandas as pd
+import streamlit as st
+
+import db_manager as db
+import jobs
+from ui import fragment, job_panel, link_report, render_df
+
+
+@fragment
+def product_list():
+    """Search, filters and paging rerun only the listing."""
+    f1, f2, f3, f4, f5 = st.columns([3, 2, 1, 1, 1])
+    search = f1.text_input("Search", placeholder="Name, SKU or description", key="cat_q")
+    colors = f2.multiselect("Color", db.get_colors(), key="cat_col")
+    p_min = f3.number_input("Min SP", 0.0, value=None, key="cat_pmin")
+    p_max = f4.number_input("Max SP", 0.0, value=None, key="cat_pmax")
+    in_stock = f5.checkbox("In stock", key="cat_stk")
+    filters = {"color": colors, "min_price": p_min, "max_price": p_max, "in_stock": in_stock}
+    pg = st.session_state.get("cat_pg", 1)
+    page_df, total = db.query_catalog(filters, search, skip=(pg - 1) * db.CATALOG_PAGE_SIZE)
+    if total:
+        pages = (total - 1) // db.CATALOG_PAGE_SIZE + 1
+        if pg > pages: st.session_state.cat_pg = pg = 1; page_df, total = db.query_catalog(filters, search)
+        view_df = page_df.copy()
+        for c in view_df.columns:
+            if view_df[c].isna().all(): view_df[c] = "-"
+        view_df.columns = ["Image", "SKU", "Product", "Size", "Color", "MRP", "SP", "Group"]
+        render_df(view_df, image_cols=["Image"], key="cat_list")
+        c_pg, c_info = st.columns([1, 3])
+        c_pg.number_input(f"Page (of {pages})", 1, pages, key="cat_pg")
+        c_info.caption(f"Showing {(pg - 1) * db.CATALOG_PAGE_SIZE + 1:,}–{(pg - 1) * db.CATALOG_PAGE_SIZE + len(view_df):,} of {total:,} products")
+    elif search or colors or p_min is not None or p_max is not None or in_stock: st.info("No products match these filters.")
+    else: st.info("Catalog is empty. Go to Upload tabs.")
+
+
+def render():
+    t1, t2, t3 = st.tabs(["🛍️ Listed Products", "➕ Single Upload", "📥 Bulk Upload"])
+
+    with t1:
+        st.markdown("### Master Catalog View")
+        with st.expander("🚀 Listing Generator Tool", expanded=False):
+            c_plat, c_fmt, c_btn = st.columns([2, 1, 1])
+            plat = c_plat.selectbox("Platform", list(db.MARKETPLACE_TEMPLATES))
+            fmt = c_fmt.selectbox("Format", ["csv", "xlsx"])
+            mark = db.get_export_watermark(plat)
+            changed = st.checkbox(f"Only changes since last export ({mark:%d-%b %H:%M})" if mark else "Only changes since last export", disabled=not mark, key="exp_delta")
+            mime = "text/csv" if fmt == "csv" else "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+            if c_btn.button("Generate File", type="primary", use_container_width=True):
+                st.session_state.export_job = jobs.submit("export", {"platform": plat, "format": fmt, "changed_only": changed}, key=f"export:{plat}:{fmt}")
+            def export_done(j):
+                name, data = jobs.artifact_loader(j, "file")  # read from GridFS only on click; the panel goes once delivered
+                st.download_button(f"⬇️ {name}", data, file_name=name, mime="text/csv" if name.endswith(".csv") else mime, use_container_width=True,
+                                   on_click=lambda: st.session_state.pop("export_job", None))
+            job_panel("export_job", export_done)
+        with st.expander("🔗 Image Link Check", expanded=False):
+            c_ref, c_chk = st.columns([3, 1])
+            refresh = c_ref.checkbox("Re-check links verified recently", key="lc_refresh")
+            if c_chk.button("Check Catalog Links", use_container_width=True):
+                st.session_state.link_job = jobs.submit("linkcheck", {"refresh": refresh}, key="linkcheck:catalog")
+            job_panel("link_job", link_report)
+        st.divider()
+        product_list()
+
+    with t2:
+        with st.container(border=True):
+            st.info("Add Product Details")
+            with st.form("add_prod_single"):
+                c1, c2 = st.columns(2)
+                img_url = c1.text_input("Image URL * (Required)")
+                sku = c2.text_input("SKU / Style ID *")
+                name = st.text_input("Product Name")
+                c3, c4 = st.columns(2)
+                grp = c3.text_input("Group ID (Style Code)")
+                fab = c4.text_input("Fabric")
+                c5, c6 = st.columns(2)
+                col = c5.text_input("Color")
+                size = c6.text_input("Sizes (e.g. S, M, L)")
+                c7, c8 = st.columns(2)
+                mrp = c7.number_input("MRP", 0.0)
+                sp = c8.number_input("Selling Price", 0.0)
+                hsn = c9 = st.text_input("HSN")
+                stk = c10 = st.number_input("Stock", 0)
+                if st.form_submit_button("Save Product"):
+                    if sku and img_url:
+                        db.add_catalog_product(sku, name, "Apparel", fab, col, size, mrp, sp, hsn, stk, img_url)
+                        st.success("Product Saved!"); st.rerun()
+                    else: st.error("Image URL and SKU are mandatory.")
+
+    with t3:
+        st.markdown("### Bulk Import & Manage")
+
+        # 1. Download Current
+        if st.button("⬇️ Download Current Live Catalog"):
+            curr_df = db.get_catalog_df()
+            if not curr_df.empty:
+                # Add 'Action' column first
+                curr_df.insert(0, 'Action', '')
+                csv = curr_df.to_csv(index=False).encode('utf-8')
+                st.download_button("Click to Download CSV", csv, "live_catalog.csv", "text/csv")
+            else: st.warning("Catalog empty")
+
+        st.divider()
+        st.info("Upload CSV with Action column ('Update' or 'Delete'). Leave Action blank for new items.")
+
+        # 2. Template
+        headers = ["Action", "Image Link 1", "Image Link 2", "Image Link 3", "Image Link 4", "SKU Code", "Product Name", "Color", "Variation", "MRP", "Selling Price", "Stock", "GST Rate %", "HSN", "Product Weight", "Fabric", "Categories", "Ideal For", "Kids Weight", "Brand Name", "Group Id", "Product Description", "Length", "Fit Type", "Neck Type", "Occasion", "Pattern", "Sleeve Length", "Pack Of"]
+        temp_df = pd.DataFrame(columns=headers)
+        st.download_button("⬇️ Download Empty Template", temp_df.to_csv(index=False).encode('utf-8'), "catalog_template.csv", "text/csv")
+
+        # 3. Upload
+        up = st.file_uploader("Upload CSV", type=['csv'])
+        sync = st.checkbox("Sync full catalog (existing SKUs are updated only where something changed)", key="up_sync")
+        if up:
+            b_up, b_chk = st.columns([1, 1])
+            raw = up.getvalue()  # same file while its job is running -> same job, even across reruns
+            if b_up.button("Process Upload", type="primary"):
+                st.session_state.upload_job = jobs.submit("upload", {"file": up.name, "sync": sync}, key=f"upload:{hashlib.sha1(raw).hexdigest()}:{sync}", payload=raw)
+            if b_chk.button("Check Image Links"):
+                st.session_state.up_link_job = jobs.submit("linkcheck", {"file": up.name}, key=f"linkcheck:{hashlib.sha1(raw).hexdigest()}", payload=raw)
+        job_panel("up_link_job", link_report)
+        def upload_done(j):
+            err = jobs.get_artifact(j, "errors")
+            if err:
+                st.error("Some rows had errors:")
+                st.dataframe(pd.read_csv(io.BytesIO(err[1])))
+            st.success(j['message'])
+        job_panel("upload_job", upload_done)
@@ -0,0 +1,49 @@
+import streamlit as st
+
+import db_manager as db
+from ui import render_df
+
+
+def render():
+    t = st.selectbox("Manage", ["Suppliers", "Items", "Staff", "Fabrics", "Colors", "Processes", "Sizes", "GST Slabs"])
+    if t == "Suppliers":
+        with st.form("sup"):
+            n=st.text_input("Name"); g=st.text_input("GST"); c=st.text_input("Ph")
+            if st.form_submit_button("Add"): db.add_supplier(n,g,c,""); st.success("Added"); st.rerun()
+        render_df(db.get_suppliers_df())
+    elif t == "Items":
+        with st.form("itm"):
+            n=st.text_input("Name"); c=st.text_input("Code"); cl=st.text_input("Color")
+            f=st.text_input("Fabrics (comma sep)")
+            if st.form_submit_button("Add"): db.add_item(n,c,cl,[x.strip() for x in f.split(',')]); st.success("Added"); st.rerun()
+        render_df(db.get_items_df())
+    elif t == "Staff":
+        with st.form("stf"):
+            n=st.text_input("Name"); r=st.selectbox("Role", ["Helper", "Stitching Karigar", "Cutting Master", "Finishing", "Packing"])
+            if st.form_submit_button("Add"): db.add_staff(n,r); st.success("Added"); st.rerun()
+        render_df(db.get_staff_df())
+    elif t == "Fabrics":
+        with st.form("fab"):
+            n=st.text_input("Name")
+            if st.form_submit_button("Add"): db.add_fabric(n); st.success("Added"); st.rerun()
+        render_df(db.get_fabrics_df())
+    elif t == "Colors":
+        with st.form("col"):
+            n=st.text_input("Name")
+            if st.form_submit_button("Add"): db.add_color(n); st.success("Added"); st.rerun()
+        render_df(db.get_colors_df())
+    elif t == "Processes":
+        with st.form("prc"):
+            n=st.text_input("Process")
+            if st.form_submit_button("Add"): db.add_process(n); st.success("Added"); st.rerun()
+        render_df(db.get_processes_df())
+    elif t == "Sizes":
+        with st.form("sz"):
+            n=st.text_input("Size")
+            if st.form_submit_button("Add"): db.add_size(n); st.success("Added"); st.rerun()
+        render_df(db.get_sizes_df())
+    elif t == "GST Slabs":
+        with st.form("gst"):
+            r = st.number_input("Rate", 0.0)
+            if st.form_submit_button("Add"): db.add_gst_slab(r); st.success("Added"); st.rerun()
+        render_df(db.get_gst_df())
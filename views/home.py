@@ -0,0 +1,28 @@
+import streamlit as st
+
+import db_manager as db
+from ui import navigate_to
+
+
+def render():
+    stats = db.get_dashboard_stats()
+    c1, c2, c3 = st.columns(3)
+    with c1:
+        with st.container(border=True): st.metric("Active Lots", stats.get('active_lots', 0))
+    with c2:
+        with st.container(border=True): st.metric("Fabric Rolls", stats.get('rolls', 0))
+    with c3:
+        with st.container(border=True): st.metric("Staff Present", stats.get('staff_present', 0))
+    st.markdown("#### 🚀 Quick Access")
+    col1, col2, col3, col4 = st.columns(4)
+    with col1:
+        if st.button("💰 Accounts", use_container_width=True): navigate_to("Accounts")
+        if st.button("👥 HR & Pay", use_container_width=True): navigate_to("HR")
+    with col2:
+        if st.button("✂️ Production", use_container_width=True): navigate_to("Production")
+        if st.button("📍 Track Lot", use_container_width=True): navigate_to("Track Lot")
+    with col3:
+        if st.button("📦 Stock", use_container_width=True): navigate_to("Stock")
+        if st.button("🛍️ Catalog", use_container_width=True): navigate_to("Catalog")
+    with col4:
+        if st.button("⚙️ Configs", use_container_width=True): navigate_to("Configurations")
@@ -0,0 +1,53 @@
+import datetime
+import io
+
+import pandas as pd
+import streamlit as st
+
+import db_manager as db
+import jobs
+from ui import fragment, job_panel, render_df
+
+
+@fragment
+def attendance():
+    s_name = st.selectbox("Staff Name", [""] + db.get_all_staff_names())
+    c1, c2 = st.columns(2)
+    if c1.button("🟢 IN", type="primary"): db.mark_attendance(s_name, "In"); st.success("Marked In"); st.rerun(scope="fragment")
+    if c2.button("🔴 OUT"): db.mark_attendance(s_name, "Out"); st.success("Marked Out"); st.rerun(scope="fragment")
+    att = db.get_today_attendance()
+    if att:
+        df_att = pd.DataFrame(att)
+        for c in ['staff', 'in_time', 'out_time']:
+            if c not in df_att.columns: df_att[c] = "-"
+        render_df(df_att[['staff', 'in_time', 'out_time']], key="att_today")
+
+
+def render():
+    t1, t2, t3 = st.tabs(["📅 Attendance", "💰 Payout", "⚙️ Rate Card"])
+    with t1:
+        attendance()
+    with t2:
+        now = datetime.datetime.now(); mon = lambda m: datetime.date(2000, m, 1).strftime('%b')
+        c1, c2, c3, c4 = st.columns(4)
+        fm = c1.selectbox("From Month", range(1, 13), index=now.month - 1, format_func=mon)
+        fy = c2.number_input("From Year", 2000, now.year, now.year)
+        tm = c3.selectbox("To Month", range(1, 13), index=now.month - 1, format_func=mon)
+        ty = c4.number_input("To Year", 2000, now.year, now.year)
+        if st.button("Calc Payout"):
+            if (fy, fm) > (ty, tm): st.error("From must be before To")
+            else:
+                rng = {"from_month": fm, "from_year": int(fy), "to_month": tm, "to_year": int(ty)}
+                st.session_state.payout_job = jobs.submit("payout", rng, key="payout:{from_year}-{from_month}:{to_year}-{to_month}".format(**rng))
+        def payout_done(j):
+            art = jobs.get_artifact(j, "payout")
+            if art: df = pd.read_csv(io.BytesIO(art[1])); render_df(df, key="payout"); st.metric("Total", f"₹ {df['Total Pay'].sum():,.2f}")
+            else: st.info(j['message'])
+        job_panel("payout_job", payout_done)
+    with t3:
+        with st.form("rate"):
+            i = st.selectbox("Item", [""] + db.get_item_names())
+            p = st.selectbox("Process", [""] + db.get_all_processes())
+            r = st.number_input("Rate", 0.0)
+            if st.form_submit_button("Set Rate"): db.add_piece_rate(i, p, r); st.success("Updated"); st.rerun()
+        render_df(db.get_rate_master_df())
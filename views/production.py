@@ -0,0 +1,104 @@
+import pandas as pd
+import streamlit as st
+
+import db_manager as db
+from ui import fragment
+
+
+@fragment
+def matrix_move(sel_lots):
+    infos = db.get_lots_info(sel_lots)
+    stages = sorted({k for l in infos for k, v in l.get('current_stage_stock', {}).items() if sum(v.values()) > 0})
+    c1, c2, c3 = st.columns(3)
+    frm = c1.selectbox("From", stages, key="mx_from")
+    to = c2.selectbox("To", ["Stitching", "Washing", "Finishing", "Packing"], key="mx_to")
+    kar = c3.selectbox("Worker", db.get_staff("Stitching Karigar"), key="mx_kar")
+    rows = [{"Lot": l['lot_no'], "Item": l['item_name'], "Size": s, "Available": q, "Move": 0}
+            for l in infos for s, q in l.get('current_stage_stock', {}).get(frm, {}).items() if q > 0]
+    if rows:
+        fill = st.checkbox("Move everything available", key="mx_fill")
+        mx = pd.DataFrame(rows)
+        if fill: mx['Move'] = mx['Available']
+        ed = st.data_editor(mx, hide_index=True, use_container_width=True, disabled=["Lot", "Item", "Size", "Available"],
+                            column_config={"Move": st.column_config.NumberColumn("Move", min_value=0, step=1)}, key=f"mx_{frm}_{fill}_{'_'.join(sel_lots)}")
+        if st.button("Move Selected", type="primary"):
+            ok, msg = db.move_lots_bulk([(r.Lot, r.Size, r.Move) for r in ed.itertuples() if r.Move > 0], frm, f"{to} - {kar}", kar)
+            if ok: st.success(msg); st.rerun()
+            else: st.error(msg)
+    else: st.info("Nothing available in this stage.")
+
+@fragment
+def fabric_picker(cod):
+    """Fabric color / roll picks for the new lot, kept in st.session_state.fab_sel for Launch Lot."""
+    det = db.get_item_details_by_code(cod)
+    req_fabs = det.get('fabrics', []) if det else []
+    inv = db.get_fabric_inventory(req_fabs)
+    picked = [(f, st.session_state.get(f"fc_{f}")) for f in req_fabs if st.session_state.get(f"fc_{f}")]
+    rolls_by_pair = db.get_available_rolls_for(picked)
+    for f in req_fabs:
+        with st.expander(f"{f}", expanded=False):
+            av = {x['color']: x for x in inv if x['fabric_name'] == f}
+            fc = st.selectbox(f"Color for {f}", [""] + list(av), key=f"fc_{f}", format_func=lambda c, av=av: f"{c} ({av[c]['kg']} kg, {av[c]['rolls']} rolls)" if c else "")
+            if fc:
+                rls = rolls_by_pair.get((f, fc), [])
+                opts = [f"{r['roll_no']} ({r['quantity']}kg)" for r in rls]
+                sel = st.multiselect("Pick Rolls", opts, key=f"ms_{f}")
+                r_ids = [r['_id'] for r in rls if f"{r['roll_no']} ({r['quantity']}kg)" in sel]
+                st.session_state.fab_sel[f] = {"ids": r_ids}
+
+@fragment
+def size_breakdown(col):
+    c_sz, c_qt, c_add = st.columns([2, 1, 1])
+    s_in = c_sz.selectbox("Size", [""]+db.get_sizes()); q_in = c_qt.number_input("Qty", 0)
+    if c_add.button("Add"): st.session_state.szs[f"{col}_{s_in}"] = q_in
+    if st.session_state.szs: st.write(st.session_state.szs)
+
+
+def render():
+    t1, t2 = st.tabs(["🧵 Move Stage", "✂️ Start New Lot"])
+    with t1:
+        mode = st.radio("Mode", ["Single Size", "Matrix"], horizontal=True, label_visibility="collapsed")
+        if mode == "Single Size":
+            lot = st.selectbox("Select Lot", [""] + db.get_active_lots())
+            if lot:
+                l = db.get_lot_info(lot)
+                st.info(f"{l['item_name']} | {l['color']}")
+                stk = l['current_stage_stock']
+                stages = [k for k, v in stk.items() if sum(v.values()) > 0]
+                c1, c2 = st.columns(2)
+                frm = c1.selectbox("From", stages)
+                to = c2.selectbox("To", ["Stitching", "Washing", "Finishing", "Packing"])
+                avail_sz = [k for k,v in stk.get(frm,{}).items() if v>0]
+                c3, c4 = st.columns(2)
+                sz = c3.selectbox("Size", avail_sz); qty = c4.number_input("Qty", 1, value=1)
+                kar = st.selectbox("Worker", db.get_staff("Stitching Karigar"))
+                if st.button("Move Items", type="primary"):
+                    ok, msg = db.move_lot(lot, frm, f"{to} - {kar}", kar, qty, sz)
+                    if ok: st.success("Moved!"); st.rerun()
+                    else: st.error(msg)
+        else:
+            sel_lots = st.multiselect("Select Lots", db.get_active_lots())
+            if sel_lots: matrix_move(sel_lots)
+    with t2:
+        lot_no = db.get_next_lot_no(); st.markdown(f"### New Lot: {lot_no}")
+        c1, c2, c3 = st.columns(3)
+        itm = c1.selectbox("Item", [""] + db.get_item_names())
+        avail_codes = db.get_codes_by_item_name(itm) if itm else []
+        cod = c2.selectbox("Code", [""] + avail_codes)
+        avail_colors = db.get_colors_by_item_code(cod) if cod else []
+        col = c3.selectbox("Color", [""] + avail_colors)
+        cm = st.selectbox("Cutting Master", db.get_staff("Cutting Master"))
+        if 'fab_sel' not in st.session_state: st.session_state.fab_sel = {}
+        if cod:
+            st.markdown("###### Fabric")
+            fabric_picker(cod)
+        st.markdown("###### Size Breakdown")
+        if 'szs' not in st.session_state: st.session_state.szs={}
+        size_breakdown(col)
+        if st.button("🚀 Launch Lot", type="primary"):
+            all_roll_ids = []
+            for k, v in st.session_state.fab_sel.items(): all_roll_ids.extend(v['ids'])
+            if itm and cod and col and cm and st.session_state.szs:
+                lot_no = db.get_next_lot_no(reserve=True)
+                db.create_lot(lot_no, itm, cod, col, st.session_state.szs, all_roll_ids, cm)
+                st.success(f"Launched {lot_no}!"); st.session_state.szs={}; st.session_state.fab_sel={}; st.rerun()
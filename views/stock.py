@@ -0,0 +1,38 @@
+import pandas as pd
+import streamlit as st
+
+import db_manager as db
+from ui import fragment, render_df
+
+
+@fragment
+def roll_entry():
+    """Fabric In form: adding a roll field reruns only this block; Save reruns the page (inventory changed)."""
+    with st.container(border=True):
+        c1, c2 = st.columns(2)
+        sup = c1.selectbox("Sup", [""]+db.get_supplier_names(), key="fin_s")
+        bill = c2.text_input("Bill No", key="fin_b")
+        c3, c4 = st.columns(2)
+        fab = c3.selectbox("Fabric", [""]+db.get_materials(), key="fin_f")
+        col = c4.selectbox("Color", [""]+db.get_colors(), key="fin_c")
+        if 'ri' not in st.session_state: st.session_state.ri = 1
+        rv = []
+        for i in range(st.session_state.ri):
+            v = st.number_input(f"Roll {i+1} (Kg)", 0.0, key=f"r_{i}")
+            if v>0: rv.append(v)
+        if st.button("➕ Roll"): st.session_state.ri+=1; st.rerun(scope="fragment")
+        if st.button("💾 Save", type="primary"):
+            if sup and fab: db.add_fabric_rolls_batch(fab, col, rv, "Kg", sup, bill); st.success("Saved"); st.rerun()
+
+
+def render():
+    t1, t2, t3 = st.tabs(["📜 Fabric", "➕ Fabric In", "➕ Acc In"])
+    with t1:
+        s = db.get_fabric_inventory()
+        render_df(pd.DataFrame([{"Fab": x['fabric_name'], "Col": x['color'], "Rolls": x['rolls'], "Kg": x['kg']} for x in s]))
+    with t2:
+        roll_entry()
+    with t3:
+        n = st.selectbox("Item", [""]+db.get_acc_names(), key="ain_n")
+        q = st.number_input("Qty", key="ain_q")
+        if st.button("Update"): db.update_accessory_stock(n, "Adj", q, "Pcs"); st.rerun()
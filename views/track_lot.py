@@ -0,0 +1,43 @@
+import pandas as pd
+import streamlit as st
+
+import db_manager as db
+from ui import render_df
+
+
+def render():
+    t1, t2 = st.tabs(["📊 Summary", "🔍 Details"])
+    with t1:
+        tot = db.get_production_totals()
+        c1, c2 = st.columns(2); c1.metric("Active Lots", tot['active_lots']); c2.metric("In Cutting", tot['Cutting'])
+        c3, c4 = st.columns(2); c3.metric("In Stitching", tot['Stitching']); c4.metric("In Finishing", tot['Finishing'])
+        st.markdown("### 📋 Active Lots Detail")
+        summary_df = db.get_lot_summary()
+        if not summary_df.empty: render_df(summary_df)
+        else: st.info("No active lots found.")
+    with t2:
+        l_s = st.selectbox("Search Lot", [""] + db.get_all_lot_numbers())
+        if l_s:
+            l = db.get_lot_info(l_s)
+            c_hd, c_st = st.columns([3, 1])
+            c_hd.markdown(f"**{l['item_name']} - {l['color']}** ({l.get('status', 'Active')})")
+            new_status = "Completed" if l.get('status', 'Active') == "Active" else "Active"
+            if c_st.button("✅ Mark Completed" if new_status == "Completed" else "↩️ Reopen", key=f"lot_st_{l_s}"):
+                ok, msg = db.set_lot_status(l_s, new_status)
+                if ok: st.success(msg); st.rerun()
+                else: st.error(msg)
+            stk = l['current_stage_stock']; stages = sorted(list(stk.keys())); all_sizes = sorted(list({sz for s in stages for sz in stk[s]}))
+            matrix = []
+            for sz in all_sizes:
+                row = {"Size": sz}
+                for s in stages: row[s] = stk[s].get(sz, 0)
+                matrix.append(row)
+            st.markdown("Current Stock"); render_df(pd.DataFrame(matrix))
+            st.markdown("History"); txns = db.get_lot_transactions(l_s)
+            if txns:
+                df_tx = pd.DataFrame(txns)
+                if 'from' in df_tx.columns: df_tx.rename(columns={'from': 'from_stage', 'to': 'to_stage'}, inplace=True)
+                for c in ['timestamp', 'from_stage', 'to_stage', 'karigar', 'qty']:
+                    if c not in df_tx.columns: df_tx[c] = "-"
+                df_tx['timestamp'] = pd.to_datetime(df_tx['timestamp']).dt.strftime('%d-%b %H:%M')
+                render_df(df_tx[['timestamp', 'from_stage', 'to_stage', 'karigar', 'qty']])